@@ -0,0 +1,186 @@
+"""
+Annotates finished games, the evaluation of every move, the best alternative and whether it was a blunder
+
+    python analyze.py games.bin --out analysis.jsonl --time 100
+    python analyze.py results.jsonl --depth 6
+    cat results.jsonl | python analyze.py -
+
+Games are read from a binary record file (see records.py) or from JSONL with a "moves" list on every line,
+such as the output of selfplay.py, "-" reads JSONL from stdin
+Each game is analysed by one worker of a process pool, so the transposition table of the worker carries over between
+the positions of the game. The positions are searched from the last to the first, so each search finds the
+positions after it already in the table
+
+Every game is written to the output as one JSON line as soon as it is done
+The output is appended to, and games already in it are skipped, so a run that was stopped can be started again
+Positions per second are reported on stderr as it goes
+
+The evaluation uses the default weights unless --weights names a file, so the same games are annotated the same
+way whether or not weights.json has been tuned, and the blunder margin keeps its meaning
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import worker
+from bitboard import PLAYERS
+from evaluate import WIN, DEFAULT_WEIGHTS
+from search import MATE
+from records import MAGIC, RecordReader, replay
+
+TIME_MS = 100
+BLUNDER = 300  # a move that loses this much evaluation against the best move is a blunder
+
+def read_games(path):
+    """Yields (game number, moves, extra fields) for every game in a record file, a JSONL file, or stdin for "-\""""
+    if path != "-":
+        with open(path, "rb") as file:
+            binary = file.read(len(MAGIC)) == MAGIC
+        if binary:
+            with RecordReader(path) as reader:
+                for number, record in enumerate(reader):
+                    yield number, record.moves, {"seed": record.seed, "settings": record.settings}
+            return
+
+    lines = sys.stdin if path == "-" else open(path)
+    try:
+        for number, line in enumerate(lines):
+            if line.strip():
+                game = json.loads(line)
+                yield number, game["moves"], {key: game[key] for key in ("seed", "winner") if key in game}
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def done_games(path):
+    """Numbers of the games already in an output file, a last line cut short when the last run stopped is removed"""
+    done = set()
+    if path is None or not os.path.exists(path):
+        return done
+    complete = 0
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            complete += len(line)
+            try:
+                done.add(json.loads(line)["game"])
+            except (ValueError, KeyError):
+                pass
+    if complete < os.path.getsize(path):
+        with open(path, "r+b") as file:
+            file.truncate(complete)
+    return done
+
+
+def is_win(score):
+    return score >= MATE
+
+
+def analyze_game(job):
+    """Searches every position of one game and annotates its moves. Runs in a worker process"""
+    number, moves, extra, time_ms, depth = job
+    start = time.perf_counter()
+    state = replay(moves)
+
+    # Score and best move of every position for its side to move, from the end of the game back to the start
+    results = [None] * (len(moves) + 1)
+    for ply in range(len(moves), -1, -1):
+        if not state.is_over():
+            results[ply] = worker.searcher.search(state, time_ms, depth)
+        if ply:
+            state.undo()
+
+    annotated = []
+    for ply, move in enumerate(moves):
+        best = results[ply]
+        after = results[ply + 1]
+        if after is None:
+            # The move ended the game, a win for the player who made it or a draw
+            state.play(move)
+            played = 0 if state.winner() is None else WIN - 1
+            state.undo()
+        else:
+            played = -after.score
+        loss = max(0, best.score - played)
+        annotated.append({"ply": ply, "player": PLAYERS[ply % 2], "move": move, "eval": best.score,
+                          "best": best.move, "played_eval": played, "loss": loss,
+                          "blunder": move != best.move and (loss >= BLUNDER or (is_win(best.score)
+                                                                                and not is_win(played))),
+                          "depth": best.depth})
+        state.play(move)
+
+    seconds = time.perf_counter() - start
+    game = {"game": number, "moves": annotated, "winner": state.winner(), "positions": len(moves) + 1,
+            "blunders": sum(entry["blunder"] for entry in annotated), "seconds": seconds}
+    game.update(extra)
+    return game
+
+
+def run(path, out=None, time_ms=TIME_MS, depth=None, workers=None, tt_mb=16, weights=None):
+    """
+    Analyses every game in path that is not already in out, returns a summary
+    weights are the evaluation weights to search with, any left out keep their defaults
+    """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    for name in weights:
+        if name not in DEFAULT_WEIGHTS:
+            raise ValueError("unknown feature: " + name)  # here, not in the workers where it would stop the pool
+    done = done_games(out)
+    jobs = ((number, moves, extra, time_ms if depth is None else 0, depth)
+            for number, moves, extra in read_games(path) if number not in done)
+
+    output = sys.stdout if out is None else open(out, "a")
+    games = 0
+    positions = 0
+    start = time.perf_counter()
+    last_report = start
+    try:
+        with multiprocessing.Pool(workers or multiprocessing.cpu_count(), initializer=worker.start_worker,
+                                  initargs=(tt_mb, weights)) as pool:
+            for game in pool.imap_unordered(analyze_game, jobs):
+                output.write(json.dumps(game) + "\n")
+                output.flush()
+                games += 1
+                positions += game["positions"]
+                now = time.perf_counter()
+                if now - last_report > 5:
+                    last_report = now
+                    print("{} games, {:.1f} positions per second".format(games, positions / (now - start)),
+                          file=sys.stderr)
+    finally:
+        if out is not None:
+            output.close()
+
+    seconds = time.perf_counter() - start
+    return {"games": games, "skipped": len(done), "positions": positions, "seconds": seconds,
+            "positions_per_second": positions / seconds if seconds else 0.0, "weights": weights}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotates the moves of finished games")
+    parser.add_argument("games", help="record file or JSONL file of games, - for JSONL on stdin")
+    parser.add_argument("--out", default=None, help="JSONL file to append the analysis to, defaults to stdout")
+    parser.add_argument("--time", type=int, default=TIME_MS, help="milliseconds per position")
+    parser.add_argument("--depth", type=int, default=None, help="search every position to this depth instead")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use, defaults to every core")
+    parser.add_argument("--tt", type=int, default=16, help="transposition table megabytes per worker")
+    parser.add_argument("--weights", default=None,
+                        help="weights file to evaluate with, such as weights.json, defaults to the hand-set weights")
+    args = parser.parse_args()
+
+    weights = None
+    if args.weights is not None:
+        with open(args.weights) as file:
+            weights = json.load(file)
+    summary = run(args.games, args.out, args.time, args.depth, args.workers, args.tt, weights)
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
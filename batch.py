@@ -0,0 +1,208 @@
+"""
+Evaluates many positions in one call, for analysis jobs, self-play and as a leaf evaluator for the searches
+
+Positions are given as an (N, 81) array of cells, 0 for empty, 1 for X, 2 for O, in the order cell = board * 9 + square
+Optional targets give the board each position must be played on (-1 for any open board), and sides the side to move
+(0 for X, 1 for O, worked out from the counts of X and O if not given)
+
+evaluate_batch returns a dict of:
+    small   (N, 9) winner of every small board, 0 for none, 1 for X, 2 for O, 3 for full with no winner
+    macro   (N,) winner of the whole game, coded the same way
+    legal   (N, 81) True for every legal move
+    score   (N,) heuristic score for the side to move, the same as evaluate.evaluate
+
+Uses NumPy when it is installed and falls back to plain Python (one position at a time) when it is not
+"""
+
+from bitboard import GameState, X, O, DRAW, FULL, LINES, WINS, SQUARES
+import evaluate as ev
+from evaluate import WIN, BOARD_WEIGHTS, evaluate
+from subtable import BASE3, get_table
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NONE = 0
+X_WON = 1
+O_WON = 2
+DRAWN = 3
+
+
+def cells_from_states(states):
+    """Turns GameStates into the (cells, targets, sides) arguments of evaluate_batch, as lists"""
+    cells = []
+    targets = []
+    sides = []
+    for state in states:
+        row = [0] * 81
+        for side in (X, O):
+            for board in range(9):
+                for square in SQUARES[state.boards[side][board]]:
+                    row[board * 9 + square] = side + 1
+        cells.append(row)
+        targets.append(-1 if state.curr_board is None else state.curr_board)
+        sides.append(state.side)
+    return cells, targets, sides
+
+
+def state_from_cells(row, target=-1, side=None):
+    """Builds a GameState from one row of cells, the move history is not known so it cannot be undone"""
+    state = GameState()
+    for cell, value in enumerate(row):
+        if value:
+            board, square = divmod(cell, 9)
+            state.boards[value - 1][board] |= 1 << square
+
+    for board in range(9):
+        x_mask = state.boards[X][board]
+        o_mask = state.boards[O][board]
+        if WINS[x_mask]:
+            state.macro[X] |= 1 << board
+        elif WINS[o_mask]:
+            state.macro[O] |= 1 << board
+        elif x_mask | o_mask == FULL:
+            state.drawn |= 1 << board
+
+    if WINS[state.macro[X]]:
+        state.result = X
+    elif WINS[state.macro[O]]:
+        state.result = O
+    elif state.closed() == FULL:
+        state.result = DRAW
+
+    moves = sum(1 for value in row if value)
+    state.turn_count = moves  # the move stack stays empty, so undo is not possible
+    state.side = moves % 2 if side is None else side
+    state.curr_board = None if target < 0 or state.closed() >> target & 1 else target
+    return state
+
+
+def evaluate_batch(cells, targets=None, sides=None):
+    """Evaluates every position, see the module docstring"""
+    if np is None:
+        return _evaluate_python(cells, targets, sides)
+    return _evaluate_numpy(cells, targets, sides)
+
+
+def _evaluate_python(cells, targets, sides):
+    result = {"small": [], "macro": [], "legal": [], "score": []}
+    for index, row in enumerate(cells):
+        state = state_from_cells(list(row), -1 if targets is None else targets[index],
+                                 None if sides is None else sides[index])
+        small = []
+        for board in range(9):
+            if state.macro[X] >> board & 1:
+                small.append(X_WON)
+            elif state.macro[O] >> board & 1:
+                small.append(O_WON)
+            elif state.drawn >> board & 1:
+                small.append(DRAWN)
+            else:
+                small.append(NONE)
+
+        winner = state.winner()
+        if winner is not None:
+            macro = X_WON if winner == "X" else O_WON
+        else:
+            macro = DRAWN if state.closed() == FULL else NONE
+
+        legal = [False] * 81
+        for move in state.legal_moves():
+            legal[move] = True
+
+        result["small"].append(small)
+        result["macro"].append(macro)
+        result["legal"].append(legal)
+        result["score"].append(evaluate(state))
+    return result
+
+
+_tables = None
+_tables_version = None  # evaluate.version the tables were made with, they are made again when the weights change
+
+
+def _numpy_tables():
+    """Lookup tables as NumPy arrays, made the first time they are needed"""
+    global _tables, _tables_version
+    if _tables is None or _tables_version != ev.version:
+        table = get_table()
+        _tables_version = ev.version
+        _tables = {
+            "wins": np.frombuffer(WINS, dtype=np.uint8).astype(bool),
+            "popcount": np.array([len(squares) for squares in SQUARES], dtype=np.int64),
+            "base3": np.array(BASE3, dtype=np.int64),
+            "small": np.array(ev.small_scores(), dtype=np.int64),
+            "value": (np.frombuffer(table.value[X], dtype=np.int8).astype(np.int64),
+                      np.frombuffer(table.value[O], dtype=np.int8).astype(np.int64)),
+            "weights": np.array(BOARD_WEIGHTS, dtype=np.int64),
+            "won": np.array([ev.WEIGHTS["won_" + ev.BOARD_CLASSES[board]] for board in range(9)], dtype=np.int64),
+            "bits": 1 << np.arange(9, dtype=np.int64),
+        }
+    return _tables
+
+
+def _evaluate_numpy(cells, targets, sides):
+    tables = _numpy_tables()
+    bits = tables["bits"]
+    wins = tables["wins"]
+    popcount = tables["popcount"]
+
+    cells = np.asarray(cells, dtype=np.int8).reshape(-1, 9, 9)
+    count = cells.shape[0]
+
+    # Masks of every small board, (N, 9)
+    x_mask = ((cells == 1) * bits).sum(axis=2)
+    o_mask = ((cells == 2) * bits).sum(axis=2)
+    x_won = wins[x_mask]
+    o_won = wins[o_mask] & ~x_won
+    drawn = ((x_mask | o_mask) == FULL) & ~x_won & ~o_won
+    small = np.where(x_won, X_WON, np.where(o_won, O_WON, np.where(drawn, DRAWN, NONE))).astype(np.int8)
+
+    # Macro board masks, (N,)
+    x_macro = (x_won * bits).sum(axis=1)
+    o_macro = (o_won * bits).sum(axis=1)
+    drawn_macro = (drawn * bits).sum(axis=1)
+    closed = x_macro | o_macro | drawn_macro
+    x_game = wins[x_macro]
+    o_game = wins[o_macro] & ~x_game
+    macro = np.where(x_game, X_WON, np.where(o_game, O_WON, np.where(closed == FULL, DRAWN, NONE))).astype(np.int8)
+
+    if sides is None:
+        sides = popcount[x_mask].sum(axis=1) - popcount[o_mask].sum(axis=1)
+    sides = np.asarray(sides, dtype=np.int64)
+    targets = np.full(count, -1, dtype=np.int64) if targets is None else np.asarray(targets, dtype=np.int64)
+
+    # Legal moves, the target board if it is open, otherwise every open board
+    board_closed = (closed[:, None] >> np.arange(9)) & 1 == 1
+    rows = np.arange(count)
+    sent = (targets >= 0) & ~board_closed[rows, np.clip(targets, 0, 8)]
+    allowed = np.where(sent[:, None], np.arange(9) == targets[:, None], ~board_closed)
+    allowed &= (macro == NONE)[:, None]
+    empty = ((FULL & ~(x_mask | o_mask))[:, :, None] >> np.arange(9)) & 1 == 1
+    legal = (empty & allowed[:, :, None]).reshape(count, 81)
+
+    # Heuristic score, the same terms as evaluate.evaluate
+    weights = ev.WEIGHTS
+    won = tables["won"]
+    index = tables["base3"][x_mask] + 2 * tables["base3"][o_mask]
+    open_term = tables["weights"] * tables["small"][index]
+    board_term = np.where(x_won, won, np.where(o_won, -won, np.where(drawn, 0, open_term)))
+    score = board_term.sum(axis=1)
+    for line in LINES:
+        x_open = (o_macro | drawn_macro) & line == 0
+        o_open = (x_macro | drawn_macro) & line == 0
+        for owned, name in ((2, "macro_two"), (1, "macro_one")):
+            x_line = (popcount[x_macro & line] == owned) & x_open
+            o_line = (popcount[o_macro & line] == owned) & o_open
+            score += weights[name] * (x_line.astype(np.int64) - o_line)
+    sign = np.where(sides == X, 1, -1)
+    score += np.where(sent, 0, sign * weights["free_move"])
+    target_index = index[rows, np.clip(targets, 0, 8)]
+    send = np.where(sides == X, tables["value"][X][target_index], tables["value"][O][target_index])
+    score += np.where(sent, weights["send_value"] * send, 0)
+    score = np.where(x_game, WIN, np.where(o_game, -WIN, score))
+    score = np.where(sides == X, score, -score)
+
+    return {"small": small, "macro": macro, "legal": legal, "score": score}
@@ -0,0 +1,235 @@
+"""
+Headless benchmark suite
+
+    python bench.py                          runs everything and prints the results as JSON
+    python bench.py --out results.json       also saves them
+    python bench.py --baseline results.json  compares against saved results, exits with 1 on a regression
+
+Benchmarks:
+    perft   number of move sequences to a fixed depth from reference positions, these must match exactly
+    search  nodes per second and time to each depth of alpha-beta, playouts per second of MCTS
+    micro   small board win check, whole board status, evaluation, move generation and batch evaluation
+
+Every run is seeded so the counts and searches are the same each time, only the timings change
+Every timing is the fastest of several runs, so the comparison is not thrown by one slow run
+The evaluation always uses the default weights, weights.json is ignored, and the results record them
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import timeit
+
+from bitboard import GameState, WINS
+from evaluate import evaluate, set_weights, DEFAULT_WEIGHTS
+from search import Searcher
+from mcts import MCTS
+from records import replay
+import batch
+
+# Reference positions as the moves that reach them, with the depth to count moves to
+POSITIONS = {
+    "start": ([], 4),
+    "opening": ([60, 58, 44, 77, 47, 24, 54, 5, 53, 76], 5),
+    "middle": ([58, 39, 35, 72, 2, 25, 68, 47, 23, 49, 36, 4, 37, 17, 78, 61, 64, 9, 0, 8], 5),
+    "late": ([65, 21, 28, 15, 61, 64, 16, 66, 33, 56, 18, 8, 74, 24, 62, 73, 12, 32, 51, 60, 59, 53, 77, 49, 42,
+              54, 1, 10, 13, 41], 6),
+    "free_move": ([46, 15, 58, 37, 13, 40, 39, 32, 51, 56, 18, 6, 62, 78, 54, 0, 2, 25, 63, 5, 47, 26, 73, 17, 77,
+                   48, 29, 19, 16, 68, 45, 7, 66, 31, 41], 4),
+}
+
+SEARCH_DEPTH = 7  # alpha-beta searches each position to this depth
+MCTS_PLAYOUTS = 4000
+REPEATS = 5  # every search is timed this many times and the fastest kept, so noise does not look like a regression
+MICRO_REPEATS = 25
+
+TOLERANCE = 0.25  # timings may be this much slower than the baseline before they count as a regression
+
+
+def perft(state, depth):
+    """Counts the move sequences of length depth, games that end early count once"""
+    if depth == 0 or state.is_over():
+        return 1
+    total = 0
+    for move in state.legal_moves():
+        state.play(move)
+        total += perft(state, depth - 1)
+        state.undo()
+    return total
+
+
+def bench_perft():
+    results = {}
+    for name, (moves, depth) in POSITIONS.items():
+        state = replay(moves)
+        start = time.perf_counter()
+        nodes = perft(state, depth)
+        seconds = time.perf_counter() - start
+        results[name] = {"depth": depth, "nodes": nodes, "seconds": seconds, "nodes_per_second": nodes / seconds}
+    return results
+
+
+def bench_search(seed):
+    results = {}
+    # Every position is searched REPEATS times, taking turns as in bench_micro, and the fastest times are kept
+    for repeat in range(REPEATS):
+        for name, (moves, depth) in POSITIONS.items():
+            state = replay(moves)
+
+            # Fixed depths with no time limit, so the node counts are the same every run
+            searcher = Searcher(0, tt_mb=4)
+            time_to_depth = {}
+            for depth in range(1, SEARCH_DEPTH + 1):
+                searcher.tt.clear()
+                result = searcher.search(state, 0, depth)
+                time_to_depth[depth] = result.seconds
+            alphabeta = {"depth": SEARCH_DEPTH, "nodes": result.nodes, "seconds": result.seconds,
+                         "time_to_depth": time_to_depth}
+
+            # The same seed every time, so each repeat builds the same tree
+            mcts = MCTS(0, seed=seed)
+            result = mcts.search(state, 0, MCTS_PLAYOUTS)
+            playouts = {"playouts": result.nodes, "seconds": result.seconds, "tree_size": mcts.size}
+
+            best = results.setdefault(name, {"alphabeta": alphabeta, "mcts": playouts})
+            best["alphabeta"]["seconds"] = min(best["alphabeta"]["seconds"], alphabeta["seconds"])
+            for depth, seconds in time_to_depth.items():
+                best["alphabeta"]["time_to_depth"][depth] = min(best["alphabeta"]["time_to_depth"][depth], seconds)
+            if playouts["seconds"] < best["mcts"]["seconds"]:
+                best["mcts"] = playouts
+
+    for result in results.values():
+        result["alphabeta"]["nodes_per_second"] = result["alphabeta"]["nodes"] / result["alphabeta"]["seconds"]
+        result["mcts"]["playouts_per_second"] = result["mcts"]["playouts"] / result["mcts"]["seconds"]
+    return results
+
+
+def bench_micro(seed):
+    """Microseconds per call of the small operations the searches are made of"""
+    rng = random.Random(seed)
+    states = []
+    while len(states) < 200:
+        state = GameState()
+        while not state.is_over() and state.turn_count < rng.randrange(10, 60):
+            state.play(rng.choice(state.legal_moves()))
+        if not state.is_over():
+            states.append(state)
+    masks = [rng.randrange(512) for i in range(200)]
+
+    def small_win():
+        for mask in masks:
+            WINS[mask]
+
+    def big_status():
+        for state in states:
+            state.is_over()
+            state.winner()
+
+    def evaluation():
+        for state in states:
+            evaluate(state)
+
+    def move_generation():
+        for state in states:
+            state.legal_moves()
+
+    def play_undo():
+        for state in states:
+            state.play(state.legal_moves()[0])
+            state.undo()
+
+    cells, targets, sides = batch.cells_from_states(states)
+    if batch.np is not None:
+        cells = batch.np.array(cells, dtype=batch.np.int8)
+
+    def batch_evaluation():
+        batch.evaluate_batch(cells, targets, sides)
+
+    cases = (("small_win_check", small_win, len(masks)), ("big_status", big_status, len(states)),
+             ("evaluate", evaluation, len(states)), ("legal_moves", move_generation, len(states)),
+             ("play_undo", play_undo, len(states)), ("batch_evaluate", batch_evaluation, len(states)))
+    for name, function, calls in cases:
+        function()  # builds any lazy tables first
+
+    # Taking turns, so a slow few seconds on the machine costs one sample of each instead of every sample of one
+    best = {}
+    for repeat in range(MICRO_REPEATS):
+        for name, function, calls in cases:
+            seconds = timeit.timeit(function, number=20)
+            best[name] = min(best.get(name, seconds), seconds)
+    return {name: {"microseconds": best[name] / (20 * calls) * 1e6} for name, function, calls in cases}
+
+
+def run(seed=0):
+    random.seed(seed)
+    # Always the hand-set weights, a tuned weights.json would change the node counts the baseline is checked against
+    set_weights(DEFAULT_WEIGHTS)
+    return {"seed": seed, "python": sys.version.split()[0], "numpy": batch.np is not None,
+            "weights": dict(DEFAULT_WEIGHTS), "perft": bench_perft(), "search": bench_search(seed),
+            "micro": bench_micro(seed)}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Returns a list of regressions, counts that differ at all and timings slower than the tolerance"""
+    problems = []
+    for name, result in baseline["perft"].items():
+        if results["perft"].get(name, {}).get("nodes") != result["nodes"]:
+            problems.append("perft " + name + ": " + str(results["perft"].get(name, {}).get("nodes"))
+                            + " nodes, expected " + str(result["nodes"]))
+
+    # Other weights search other trees, so the node counts only have to match when the weights do
+    same_weights = baseline.get("weights", results["weights"]) == results["weights"]
+    if not same_weights:
+        problems.append("the baseline was run with other evaluation weights, search node counts not compared")
+
+    for name, result in baseline["search"].items():
+        new = results["search"].get(name)
+        if new is None:
+            continue
+        if same_weights and new["alphabeta"]["nodes"] != result["alphabeta"]["nodes"]:
+            problems.append("search " + name + ": alpha-beta visited " + str(new["alphabeta"]["nodes"])
+                            + " nodes, expected " + str(result["alphabeta"]["nodes"]))
+        if new["alphabeta"]["nodes_per_second"] < result["alphabeta"]["nodes_per_second"] * (1 - tolerance):
+            problems.append("search " + name + ": alpha-beta nodes per second dropped to "
+                            + str(int(new["alphabeta"]["nodes_per_second"])))
+        if new["mcts"]["playouts_per_second"] < result["mcts"]["playouts_per_second"] * (1 - tolerance):
+            problems.append("search " + name + ": MCTS playouts per second dropped to "
+                            + str(int(new["mcts"]["playouts_per_second"])))
+
+    for name, result in baseline["micro"].items():
+        new = results["micro"].get(name)
+        if new is not None and new["microseconds"] > result["microseconds"] * (1 + tolerance):
+            problems.append("micro " + name + ": " + "{:.3f}".format(new["microseconds"])
+                            + " us, was " + "{:.3f}".format(result["microseconds"]))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the engine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="file to save the results to")
+    parser.add_argument("--baseline", default=None, help="saved results to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.seed)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+    if args.out is not None:
+        with open(args.out, "w") as out:
+            json.dump(results, out, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            problems = compare(results, json.load(file), args.tolerance)
+        for problem in problems:
+            print("REGRESSION: " + problem, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
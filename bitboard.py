@@ -0,0 +1,229 @@
+"""
+Bitboard representation of a strategic tic-tac-toe game
+
+Each small board is stored as two 9-bit masks, one for X and one for O
+Squares inside a small board are numbered 0-8 in the manner you would read a book (square = row * 3 + col)
+Cells on the whole board are numbered 0-80, cell = board * 9 + square, boards are numbered the same way as squares
+
+Win checks are a single table lookup on a 9-bit mask, so no lists are built while checking for wins
+The state also keeps a Zobrist hash of itself up to date, used to key the transposition table
+
+Moves are played and taken back in place on a move stack allocated once for the whole game, so play and undo
+allocate nothing (the search still builds its move lists at every node). Moves taken back stay on the stack above the
+current ply until a new move is played, which gives redo for free
+"""
+
+import random
+
+X = 0  # side index for X
+O = 1  # side index for O
+DRAW = 2  # result of a game where every board closed with no winner
+PLAYERS = ("X", "O")
+MAX_MOVES = 81  # a game can never be longer than this
+
+# Status changes a move can make to the board it was played on, recorded on the move stack
+WON_BOARD = 1
+DREW_BOARD = 2
+
+FULL = 0x1FF  # every square of a small board
+
+# Rows, columns and diagonals of a 3x3 board as 9-bit masks
+LINES = (0b000000111, 0b000111000, 0b111000000,
+         0b001001001, 0b010010010, 0b100100100,
+         0b100010001, 0b001010100)
+
+# WINS[mask] is 1 if the mask contains a full line
+WINS = bytes(int(any(mask & line == line for line in LINES)) for mask in range(512))
+
+# SQUARES[mask] is a tuple of the squares set in the mask, used to turn masks into moves without looping over bits
+SQUARES = tuple(tuple(sq for sq in range(9) if mask >> sq & 1) for mask in range(512))
+
+CORNERS = 0b101000101
+
+# Zobrist keys, a fixed seed keeps hashes the same between runs so saved tables stay valid
+_zobrist_rng = random.Random(20240)
+ZOBRIST_CELLS = tuple(tuple(_zobrist_rng.getrandbits(64) for cell in range(81)) for side in range(2))
+ZOBRIST_TARGET = tuple(_zobrist_rng.getrandbits(64) for board in range(10))  # index 9 is a free move
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+
+
+def bit_count(mask):
+    """Number of squares set in a mask"""
+    return len(SQUARES[mask & FULL])
+
+
+class GameState:
+    """
+    Compact state of a whole game
+    boards[side][b] holds the squares taken by that side in small board b
+    macro[side] holds the small boards won by that side, drawn holds the small boards that are full with no winner
+    Only the board played on and the macro board are updated by a move, so asking for the status costs nothing
+    """
+    def __init__(self):
+        self.boards = [[0] * 9, [0] * 9]
+        self.macro = [0, 0]
+        self.drawn = 0
+        self.curr_board = None  # board the current player must play on, None if any open board
+        self.side = X  # side to move
+        self.turn_count = 0
+        self.result = None  # X, O or DRAW once the game is over
+        self.hash = ZOBRIST_TARGET[9]
+
+        # The move stack, entry i is about the move played at ply i
+        self.ply = 0  # moves on the stack that are played
+        self.top = 0  # moves on the stack, the ones past ply were taken back and can be redone
+        self.stack_cells = [0] * MAX_MOVES  # cell played
+        self.stack_targets = [None] * MAX_MOVES  # current board before the move
+        self.stack_hashes = [0] * MAX_MOVES  # hash before the move
+        self.stack_changes = [0] * MAX_MOVES  # WON_BOARD or DREW_BOARD if the move closed its board
+
+    def copy(self):
+        """Returns an independent copy of the state, move stack included"""
+        other = GameState.__new__(GameState)
+        other.boards = [list(self.boards[X]), list(self.boards[O])]
+        other.macro = list(self.macro)
+        other.drawn = self.drawn
+        other.curr_board = self.curr_board
+        other.side = self.side
+        other.turn_count = self.turn_count
+        other.result = self.result
+        other.hash = self.hash
+        other.ply = self.ply
+        other.top = self.top
+        other.stack_cells = list(self.stack_cells)
+        other.stack_targets = list(self.stack_targets)
+        other.stack_hashes = list(self.stack_hashes)
+        other.stack_changes = list(self.stack_changes)
+        return other
+
+    def played(self):
+        """List of the cells played so far, in order"""
+        return self.stack_cells[:self.ply]
+
+    def can_redo(self):
+        return self.ply < self.top
+
+    @property
+    def player(self):
+        """The current player as "X" or "O\""""
+        return PLAYERS[self.side]
+
+    def closed(self):
+        """Mask of small boards that can no longer be played on"""
+        return self.macro[X] | self.macro[O] | self.drawn
+
+    def won_boards(self, side):
+        """Tuple of the small boards won by a side"""
+        return SQUARES[self.macro[side]]
+
+    def drawn_boards(self):
+        """Tuple of the small boards that are full with no winner"""
+        return SQUARES[self.drawn]
+
+    def open_boards(self):
+        """Tuple of the small boards that can still be played on"""
+        return SQUARES[FULL & ~self.closed()]
+
+    def open_squares(self, board):
+        """Mask of the empty squares in a small board"""
+        return FULL & ~(self.boards[X][board] | self.boards[O][board])
+
+    def cell(self, cell):
+        """Returns "X", "O" or None for a cell (0-80)"""
+        board, square = divmod(cell, 9)
+        if self.boards[X][board] >> square & 1:
+            return "X"
+        elif self.boards[O][board] >> square & 1:
+            return "O"
+        return None
+
+    def legal_boards(self):
+        """Returns a tuple of the boards the current player may play on"""
+        if self.result is not None:
+            return ()
+        if self.curr_board is not None:
+            return (self.curr_board,)
+        return SQUARES[FULL & ~self.closed()]
+
+    def legal_moves(self):
+        """Returns a list of every legal cell (0-80) for the current player"""
+        moves = []
+        for board in self.legal_boards():
+            base = board * 9
+            moves.extend(base + square for square in SQUARES[self.open_squares(board)])
+        return moves
+
+    def play(self, cell):
+        """Places the current player's marker on a cell, updates the won boards and passes the turn"""
+        board, square = divmod(cell, 9)
+        side = self.side
+        ply = self.ply
+        self.stack_cells[ply] = cell
+        self.stack_targets[ply] = self.curr_board
+        self.stack_hashes[ply] = self.hash
+        self.ply = self.top = ply + 1
+        old_target = 9 if self.curr_board is None else self.curr_board
+
+        mask = self.boards[side][board] | (1 << square)
+        self.boards[side][board] = mask
+
+        # Only the board that was played on can change status, and the game can only be won by the player who moved
+        if WINS[mask]:
+            self.macro[side] |= 1 << board
+            self.stack_changes[ply] = WON_BOARD
+            if WINS[self.macro[side]]:
+                self.result = side
+        elif mask | self.boards[side ^ 1][board] == FULL:
+            self.drawn |= 1 << board
+            self.stack_changes[ply] = DREW_BOARD
+        else:
+            self.stack_changes[ply] = 0
+        if self.result is None and self.closed() == FULL:
+            self.result = DRAW
+
+        # The square played decides the next board, unless that board is closed
+        if self.closed() >> square & 1:
+            self.curr_board = None
+        else:
+            self.curr_board = square
+
+        self.side = side ^ 1
+        self.turn_count += 1
+        self.hash ^= (ZOBRIST_CELLS[side][cell] ^ ZOBRIST_TARGET[old_target] ^ ZOBRIST_SIDE
+                      ^ ZOBRIST_TARGET[9 if self.curr_board is None else self.curr_board])
+
+    def undo(self):
+        """Takes back the last move played, it stays on the stack for redo until another move is played"""
+        ply = self.ply - 1
+        self.ply = ply
+        self.curr_board = self.stack_targets[ply]
+        self.hash = self.stack_hashes[ply]
+        board, square = divmod(self.stack_cells[ply], 9)
+        side = self.side ^ 1
+
+        self.boards[side][board] &= ~(1 << square)
+        change = self.stack_changes[ply]
+        if change == WON_BOARD:
+            self.macro[side] &= ~(1 << board)
+        elif change == DREW_BOARD:
+            self.drawn &= ~(1 << board)
+        self.result = None  # no moves are played after the game is over
+
+        self.side = side
+        self.turn_count -= 1
+
+    def redo(self):
+        """Plays again the last move taken back, keeping the moves after it for redo"""
+        top = self.top
+        self.play(self.stack_cells[self.ply])
+        self.top = top
+
+    def winner(self):
+        """Returns "X" or "O" if someone won the whole board, otherwise None"""
+        if self.result == X or self.result == O:
+            return PLAYERS[self.result]
+        return None
+
+    def is_over(self):
+        """True if the game has been won or there are no boards left to play on"""
+        return self.result is not None
@@ -0,0 +1,176 @@
+"""
+Opening book, the best move of early positions worked out ahead of time by deep searches
+
+    python book.py --plies 6 --width 3 --depth 8    builds book.bin on every core
+
+The book is grown from the empty board one ply at a time. Every position is searched to --depth,
+then its best move and the next --width - 1 moves in search order are followed to the next ply
+Positions are stored under their canonical hash (see symmetry.py), and their move in the canonical image,
+so a position found in any of its 8 orientations is in the book
+
+The book file is a header, then the sorted hashes and, for each, the move, search depth and score
+It is read through a memory map and probed by binary search on the mapped arrays, so a lookup copies nothing
+"""
+
+import argparse
+import bisect
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from array import array
+
+import worker
+from records import replay
+from symmetry import canonical_hash, map_move, unmap_move
+
+MAGIC = b"STBK"
+HEADER = struct.Struct("<4sIQ")  # magic, plies covered, number of positions
+
+PLIES = 6
+WIDTH = 3
+DEPTH = 8
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
+def search_position(job):
+    """Searches one position to the book depth. Runs in a worker process"""
+    moves, depth, width = job
+    state = replay(moves)
+    result = worker.searcher.search(state, 0, depth)
+    others = [move for move in worker.searcher.order(state, state.legal_moves(), 0) if move != result.move]
+    return moves, result.move, result.score, result.depth, [result.move] + others[:width - 1]
+
+
+def build(plies=PLIES, width=WIDTH, depth=DEPTH, workers=None, tt_mb=16):
+    """Searches every position of the book tree, returns a dict of canonical hash -> (move, depth, score)"""
+    book = {}
+    level = [[]]  # the moves that reach each position of the current ply
+    with multiprocessing.Pool(workers or multiprocessing.cpu_count(), initializer=worker.start_worker,
+                              initargs=(tt_mb,)) as pool:
+        for ply in range(plies):
+            jobs = []
+            for moves in level:
+                state = replay(moves)
+                key = canonical_hash(state)[0]
+                if key not in book and not state.is_over():
+                    book[key] = None  # claimed, so a transposition or mirror image is not searched twice
+                    jobs.append((moves, depth, width))
+
+            following = []
+            for moves, move, score, reached, children in pool.imap_unordered(search_position, jobs):
+                key, transform = canonical_hash(replay(moves))
+                book[key] = (map_move(move, transform), reached, score)
+                following.extend(moves + [child] for child in children)
+            print("ply {}: {} positions searched".format(ply, len(jobs)), file=sys.stderr)
+            level = following
+    return book
+
+
+def write_book(path, book, plies):
+    """Writes a dict of canonical hash -> (move, depth, score) as a book file"""
+    keys = array("Q", sorted(key for key, entry in book.items() if entry is not None))
+    moves = array("B", (book[key][0] for key in keys))
+    depths = array("B", (book[key][1] for key in keys))
+    scores = array("i", (book[key][2] for key in keys))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, plies, len(keys)))
+        keys.tofile(file)
+        scores.tofile(file)  # kept before the byte arrays so every array stays aligned
+        moves.tofile(file)
+        depths.tofile(file)
+    os.replace(temporary, path)
+
+
+class Book:
+    """A book file opened through a memory map, every array is a view straight onto the mapped file"""
+    def __init__(self, path=PATH):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise ValueError(path + " is too short to be an opening book file")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.plies, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(path + " is not an opening book file")
+        if len(self.map) != HEADER.size + 14 * count:  # key, score, move and depth of each position
+            self.close()
+            raise ValueError(path + " is not the size its header gives, it may have been cut short")
+
+        view = memoryview(self.map)
+        start = HEADER.size
+        self.keys = view[start:start + 8 * count].cast("Q")
+        start += 8 * count
+        self.scores = view[start:start + 4 * count].cast("i")
+        start += 4 * count
+        self.moves = view[start:start + count]
+        self.depths = view[start + count:start + 2 * count]
+        view.release()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def probe(self, state):
+        """(move, depth, score) for the position, None if it is not in the book"""
+        if state.turn_count >= self.plies or state.result is not None:
+            return None
+        key, transform = canonical_hash(state)
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        move = unmap_move(self.moves[i], transform)
+        if move not in state.legal_moves():
+            return None  # two positions with the same hash, trust the search instead
+        return move, self.depths[i], self.scores[i]
+
+    def close(self):
+        if self.map is None:
+            return
+        if hasattr(self, "keys"):
+            for view in (self.keys, self.scores, self.moves, self.depths):
+                view.release()
+        self.map.close()
+        self.file.close()
+        self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path=PATH):
+    """Opens the book at path, None if it has not been built or cannot be used, which is reported on stderr"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return Book(path)
+    except (OSError, ValueError) as error:
+        print("opening book not loaded, playing without it: {}".format(error), file=sys.stderr)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the opening book")
+    parser.add_argument("--out", default=PATH)
+    parser.add_argument("--plies", type=int, default=PLIES, help="moves into the game the book covers")
+    parser.add_argument("--width", type=int, default=WIDTH, help="moves followed from every position")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="search depth of every position")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tt", type=int, default=16, help="transposition table megabytes per worker")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    book = build(args.plies, args.width, args.depth, args.workers, args.tt)
+    write_book(args.out, book, args.plies)
+    print({"path": args.out, "plies": args.plies, "positions": sum(entry is not None for entry in book.values()),
+           "seconds": time.perf_counter() - start})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Headless strategic tic-tac-toe engine, the game and the AI without any display
+Does not import pygame, so it can run on servers, in batch jobs and in worker processes
+
+Moves are cells numbered 0-80, cell = board * 9 + square, see bitboard.py
+
+Searches can run in a background thread (start_search) so a front end stays responsive while the AI thinks,
+and the engine can ponder the opponent's likely replies while they decide
+"""
+
+import threading
+import time
+
+from bitboard import GameState
+from search import Searcher, SearchResult
+from mcts import MCTS
+from parallel import ParallelSearcher
+from stats import SearchStats
+import tablebase
+import book
+
+ALGORITHMS = ("alphabeta", "mcts")
+
+
+class SearchHandle:
+    """A search running in a background thread, poll done() and collect result() when it is"""
+    def __init__(self, target, *args):
+        self.stop_event = threading.Event()
+        self._result = None
+        self.thread = threading.Thread(target=self._run, args=(target, args), daemon=True)
+        self.thread.start()
+
+    def _run(self, target, args):
+        self._result = target(*args, self.stop_event)
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def result(self, timeout=None):
+        """Waits for the search and returns what it returned, None if it is still running after timeout seconds"""
+        self.thread.join(timeout)
+        return self._result
+
+    def cancel(self):
+        """Stops the search and waits for the thread to finish"""
+        self.stop_event.set()
+        self.thread.join()
+
+
+class Engine:
+    """
+    A game in progress plus the AI that plays it
+    algorithm is "alphabeta" (search.Searcher) or "mcts" (mcts.MCTS)
+    The search and its transposition table or tree are kept for the whole game so each move reuses the work of the last
+    Alpha-beta uses the endgame tablebase at tablebase_path if it has been generated, None turns it off
+    Either algorithm plays from the opening book at book_path while the game is in it, None turns it off
+    With workers above 1, alpha-beta splits each search across that many processes (parallel.ParallelSearcher)
+    """
+    def __init__(self, time_ms=1000, tt_mb=16, algorithm="alphabeta", max_nodes=200000,
+                 tablebase_path=tablebase.PATH, book_path=book.PATH, workers=1):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm: " + str(algorithm))
+
+        self.state = GameState()
+        self.algorithm = algorithm
+        if algorithm == "mcts":
+            self.searcher = MCTS(time_ms, max_nodes)
+        elif workers > 1:
+            self.searcher = ParallelSearcher(time_ms, workers, tt_mb=tt_mb)
+            self.searcher.start()  # the workers start up while the first move is being decided
+        else:
+            tables = None if tablebase_path is None else tablebase.load(tablebase_path)
+            self.searcher = Searcher(time_ms, tt_mb=tt_mb, tablebase=tables)
+        self.book = None if book_path is None else book.load(book_path)
+        self.last_result = None  # SearchResult of the last call to best_move
+        self.pondering = None  # SearchHandle of the ponder thread while it runs
+        self.pondered = {}  # hash of a position after an opponent reply -> SearchResult found while pondering
+
+    @property
+    def player(self):
+        """The player to move, "X" or "O\""""
+        return self.state.player
+
+    @property
+    def curr_board(self):
+        """The board the player to move must play on, None if any open board"""
+        return self.state.curr_board
+
+    @property
+    def turn_count(self):
+        return self.state.turn_count
+
+    def legal_moves(self):
+        """Every cell the player to move may play"""
+        return self.state.legal_moves()
+
+    def play(self, move):
+        """Plays a move for the player to move, raises ValueError if it is not legal"""
+        if move not in self.state.legal_moves():
+            raise ValueError("illegal move: " + str(move))
+        self.state.play(move)
+
+    def undo(self):
+        """Takes back the last move, raises ValueError if no moves have been played"""
+        if not self.state.ply:
+            raise ValueError("no moves to undo")
+        self.stop_pondering()
+        self.state.undo()
+
+    def redo(self):
+        """Plays again the last move taken back, raises ValueError if there is none"""
+        if not self.state.can_redo():
+            raise ValueError("no moves to redo")
+        self.stop_pondering()
+        self.state.redo()
+
+    def winner(self):
+        """"X" or "O" if someone has won, otherwise None"""
+        return self.state.winner()
+
+    def is_over(self):
+        """True if the game is won or no boards are left to play on"""
+        return self.state.is_over()
+
+    def best_move(self, time_ms=None):
+        """Searches for the best move for the player to move within time_ms milliseconds, None if the game is over"""
+        return self.start_search(time_ms).result().move
+
+    def start_search(self, time_ms=None):
+        """
+        Starts searching for the best move in a background thread and returns its SearchHandle
+        The search runs on a copy of the game, so moves can be shown while it thinks
+        If the position was already searched while pondering, that result is used and the handle is done at once
+        """
+        self.stop_pondering()
+        state = self.state.copy()
+        return SearchHandle(self._search, state, time_ms)
+
+    def _search(self, state, time_ms, stop_event):
+        result = self.book_move(state)
+        if result is not None:
+            self.last_result = result
+            return result
+
+        result = self.pondered.pop(state.hash, None)
+        if result is None or result.move not in state.legal_moves():
+            result = self.searcher.search(state, time_ms, stop_event=stop_event)
+        self.pondered.clear()
+        self.last_result = result
+        return result
+
+    def book_move(self, state):
+        """SearchResult of the book move for the position, None if the book does not have it"""
+        if self.book is None:
+            return None
+        start = time.perf_counter()
+        found = self.book.probe(state)
+        if found is None:
+            return None
+        move, depth, score = found
+        stats = SearchStats("book")
+        stats.depth = depth
+        stats.seconds = time.perf_counter() - start
+        return SearchResult(move, score, depth, 0, stats.seconds, stats)
+
+    def ponder(self, time_ms=None):
+        """
+        Starts thinking on the opponent's time, call when it is their move
+        Alpha-beta searches the replies to each of their likely moves, most likely first, and keeps the results
+        MCTS grows its tree under the current position, which is kept once they reply
+        """
+        self.stop_pondering()
+        if not self.state.is_over():
+            self.pondering = SearchHandle(self._ponder, self.state.copy(), time_ms)
+        return self.pondering
+
+    def _ponder(self, state, time_ms, stop_event):
+        if self.algorithm == "mcts":
+            self.searcher.search(state, 0, stop_event=stop_event)
+            return
+
+        for reply in self.searcher.order(state, state.legal_moves(), 0):
+            if stop_event.is_set():
+                break
+            state.play(reply)
+            if not state.is_over():
+                result = self.searcher.search(state, time_ms, stop_event=stop_event)
+                if not stop_event.is_set():
+                    self.pondered[state.hash] = result
+            state.undo()
+
+    def close(self):
+        """Stops pondering and ends the worker processes of a parallel search"""
+        self.stop_pondering()
+        if isinstance(self.searcher, ParallelSearcher):
+            self.searcher.close()
+
+    def stop_pondering(self):
+        """Stops the ponder thread if it is running, results it finished are kept"""
+        if self.pondering is not None:
+            self.pondering.cancel()
+            self.pondering = None
@@ -0,0 +1,264 @@
+"""
+Heuristic evaluation of a whole game, used by the search at the end of its depth
+Scores are from the point of view of the side to move, positive is good for them
+
+The score is a weighted sum of features, each counted for X minus for O:
+    won_center, won_corner, won_edge   small boards won, by where they are on the macro board
+    macro_two      macro lines with two boards won and the third still open
+    macro_one      macro lines with one board won and the other two still open
+    small_threat   small lines that can be finished next move, on the open boards
+    small_value    perfect-play value of each open board on its own, with X and with O to move
+    small_center   center squares held on the open boards
+    small_corner   corner squares held on the open boards
+    free_move      1 for the side to move when it may play on any open board
+    send_value     perfect-play value of the board the side to move has been sent to, with them to move
+The small board features are scaled by BOARD_WEIGHTS, since a board in more macro lines matters more
+
+The weights are in WEIGHTS, loaded from weights.json when it exists (written by tune.py)
+If the file cannot be used, that is reported on stderr and the defaults are kept
+Everything about a small board is looked up from one table per configuration, rebuilt when the weights change
+"""
+
+import json
+import os
+import sys
+
+from bitboard import X, O, LINES, WINS, SQUARES, CORNERS
+from subtable import BASE3, get_table
+
+WIN = 100000  # score of a won game, search subtracts the ply so faster wins score higher
+
+BOARD_WEIGHTS = (3, 2, 3, 2, 4, 2, 3, 2, 3)  # center board is in the most macro lines, then corners, then edges
+BOARD_CLASSES = ("corner", "edge", "corner", "edge", "center", "edge", "corner", "edge", "corner")
+
+FEATURES = ("won_center", "won_corner", "won_edge", "macro_two", "macro_one", "small_threat", "small_value",
+            "small_center", "small_corner", "free_move", "send_value")
+
+# The hand-set weights, used until a tuned weights file is saved
+DEFAULT_WEIGHTS = {"won_center": 400, "won_corner": 300, "won_edge": 200, "macro_two": 300, "macro_one": 0,
+                   "small_threat": 8, "small_value": 10, "small_center": 0, "small_corner": 0,
+                   "free_move": 0, "send_value": 0}
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+# PAIRS[mask] is a tuple of the lines that have exactly two squares set in the mask
+PAIRS = tuple(tuple(line for line in LINES if len(SQUARES[mask & line]) == 2) for mask in range(512))
+
+# SINGLES[mask] is a tuple of the lines that have exactly one square set in the mask
+SINGLES = tuple(tuple(line for line in LINES if len(SQUARES[mask & line]) == 1) for mask in range(512))
+
+WEIGHTS = dict(DEFAULT_WEIGHTS)
+version = 0  # goes up every time the weights change, so tables built from them can tell they are stale
+_won = None  # score of winning each board
+_small = None  # score of each small board configuration while it is open, before its board weight
+
+
+def set_weights(weights):
+    """Uses new weights, any feature left out keeps its default"""
+    global WEIGHTS, version, _small
+    new = dict(DEFAULT_WEIGHTS)
+    for name, value in weights.items():
+        if name not in DEFAULT_WEIGHTS:
+            raise ValueError("unknown feature: " + name)
+        new[name] = int(round(value))
+    WEIGHTS = new  # only once every weight is good, so a bad file leaves the weights as they were
+    version += 1
+    _small = None
+    _build_won()
+
+
+def load_weights(path=PATH):
+    """Loads the weights saved at path, returns False if there is no file, raises ValueError if it cannot be used"""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path) as file:
+            weights = json.load(file)
+        set_weights(weights)
+    except (OSError, ValueError, TypeError, AttributeError) as error:
+        raise ValueError("{}: {}".format(path, error))
+    return True
+
+
+def save_weights(weights, path=PATH):
+    with open(path, "w") as file:
+        json.dump({name: int(round(weights[name])) for name in FEATURES}, file, indent=2)
+
+
+def _build_won():
+    global _won
+    _won = tuple(WEIGHTS["won_" + BOARD_CLASSES[board]] for board in range(9))
+
+
+def small_features(idx):
+    """(threat, value, center, corner) of one small board configuration, for X minus for O"""
+    return small_feature_table()[idx]
+
+
+_small_feature_table = None
+
+
+def small_feature_table():
+    """small_features of every configuration, worked out once from the pairs of masks that do not overlap"""
+    global _small_feature_table
+    if _small_feature_table is None:
+        table = get_table()
+        threats = table.threats
+        x_value, o_value = table.value
+        rows = [None] * len(threats)
+        for x_mask in range(512):
+            x_center = x_mask >> 4 & 1
+            x_corners = len(SQUARES[x_mask & CORNERS])
+            x_index = BASE3[x_mask]
+            for o_mask in range(512):
+                if x_mask & o_mask:
+                    continue
+                idx = x_index + 2 * BASE3[o_mask]
+                rows[idx] = (threats[idx], x_value[idx] + o_value[idx], x_center - (o_mask >> 4 & 1),
+                             x_corners - len(SQUARES[o_mask & CORNERS]))
+        _small_feature_table = tuple(rows)
+    return _small_feature_table
+
+
+def small_scores():
+    """Score of every small board configuration while it is open, built from the weights the first time it is needed"""
+    global _small
+    if _small is None:
+        threat, value, center, corner = (WEIGHTS["small_threat"], WEIGHTS["small_value"], WEIGHTS["small_center"],
+                                         WEIGHTS["small_corner"])
+        _small = tuple(threat * row[0] + value * row[1] + center * row[2] + corner * row[3]
+                       for row in small_feature_table())
+    return _small
+
+
+def open_twos(own, opp):
+    """Number of lines where own has two squares and opp has none, so they can be finished next move"""
+    count = 0
+    for line in PAIRS[own]:
+        if not opp & line:
+            count += 1
+    return count
+
+
+def open_ones(own, opp):
+    """Number of lines where own has one square and opp has none"""
+    count = 0
+    for line in SINGLES[own]:
+        if not opp & line:
+            count += 1
+    return count
+
+
+def evaluate(state):
+    """Scores the position for the side to move"""
+    if WINS[state.macro[X]]:
+        score = WIN
+    elif WINS[state.macro[O]]:
+        score = -WIN
+
+    else:
+        x_macro, o_macro = state.macro
+        closed = x_macro | o_macro | state.drawn
+        score = 0
+
+        small = _small or small_scores()
+        won = _won
+        x_boards, o_boards = state.boards
+        for board in range(9):
+            bit = 1 << board
+            if x_macro & bit:
+                score += won[board]
+            elif o_macro & bit:
+                score -= won[board]
+            elif not closed & bit:
+                score += BOARD_WEIGHTS[board] * small[BASE3[x_boards[board]] + 2 * BASE3[o_boards[board]]]
+
+        weights = WEIGHTS
+        score += weights["macro_two"] * (open_twos(x_macro, o_macro | state.drawn)
+                                         - open_twos(o_macro, x_macro | state.drawn))
+        if weights["macro_one"]:
+            score += weights["macro_one"] * (open_ones(x_macro, o_macro | state.drawn)
+                                             - open_ones(o_macro, x_macro | state.drawn))
+        if weights["free_move"] or weights["send_value"]:
+            sign = 1 if state.side == X else -1
+            board = state.curr_board
+            if board is None:
+                score += sign * weights["free_move"]
+            else:
+                idx = BASE3[x_boards[board]] + 2 * BASE3[o_boards[board]]
+                score += weights["send_value"] * get_table().value[state.side][idx]
+
+    return score if state.side == X else -score
+
+
+def features(state):
+    """The features of a position that is not over, for X minus for O, in the order of FEATURES"""
+    x_macro, o_macro = state.macro
+    closed = x_macro | o_macro | state.drawn
+    values = dict.fromkeys(FEATURES, 0)
+    for board in range(9):
+        bit = 1 << board
+        name = "won_" + BOARD_CLASSES[board]
+        if x_macro & bit:
+            values[name] += 1
+        elif o_macro & bit:
+            values[name] -= 1
+        elif not closed & bit:
+            idx = BASE3[state.boards[X][board]] + 2 * BASE3[state.boards[O][board]]
+            for name, value in zip(("small_threat", "small_value", "small_center", "small_corner"),
+                                   small_features(idx)):
+                values[name] += BOARD_WEIGHTS[board] * value
+
+    values["macro_two"] = open_twos(x_macro, o_macro | state.drawn) - open_twos(o_macro, x_macro | state.drawn)
+    values["macro_one"] = open_ones(x_macro, o_macro | state.drawn) - open_ones(o_macro, x_macro | state.drawn)
+    board = state.curr_board
+    if board is None:
+        values["free_move"] = 1 if state.side == X else -1
+    else:
+        idx = BASE3[state.boards[X][board]] + 2 * BASE3[state.boards[O][board]]
+        values["send_value"] = get_table().value[state.side][idx]
+    return [values[name] for name in FEATURES]
+
+
+def macro_priority(state, board):
+    """
+    How much the side to move wants to play on a board when it has a free move, from the macro board alone
+    Winning the board to finish a macro line counts most, then stopping the opponent finishing one,
+    then building lines, then the board's own weight. A board the side to move can win next move counts for more
+    """
+    own = state.macro[state.side]
+    opp = state.macro[state.side ^ 1]
+    bit = 1 << board
+    priority = BOARD_WEIGHTS[board]
+    for line in LINES:
+        if not line & bit:
+            continue
+        if not line & (opp | state.drawn):
+            owned = len(SQUARES[line & own])
+            priority += 1000 if owned == 2 else 10 * (owned + 1)
+        if not line & (own | state.drawn) and len(SQUARES[line & opp]) == 2:
+            priority += 500
+    if open_twos(state.boards[state.side][board], state.boards[state.side ^ 1][board]):
+        priority *= 2
+    return priority
+
+
+def send_penalty(state, square):
+    """
+    How bad it is to send the opponent to a board, used for move ordering
+    Sending them to a closed board gives them a free move, sending them to a board they can win gives them that board
+    """
+    if state.closed() >> square & 1:
+        return 2
+
+    if open_twos(state.boards[state.side ^ 1][square], state.boards[state.side][square]):
+        return 1
+    return 0
+
+
+_build_won()
+try:
+    load_weights()
+except ValueError as error:
+    # A broken weights file should not stop everything that imports the evaluation, play on the defaults
+    print("weights not loaded, using the defaults: {}".format(error), file=sys.stderr)
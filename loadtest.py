@@ -0,0 +1,134 @@
+"""
+Load test for server.py, simulates many players at once against a running server
+
+    python server.py --workers 4 &
+    python loadtest.py --players 2000 --duration 30 --time 5
+
+Every player starts a game, plays random moves with the AI replying to each one, and starts a new game when it ends
+Players share a few connections and send their requests over them concurrently
+At the end the client side latency of each move, the games finished and the server's own stats are printed as JSON
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from server import percentile
+
+
+class Connection:
+    """One connection to the server, replies are matched to requests by their id"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = {}
+        self.ids = itertools.count()
+        self.listener = asyncio.ensure_future(self.listen())
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+        return cls(reader, writer)
+
+    async def listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self.waiting.pop(reply.get("id"), None)
+            if future is not None:
+                future.set_result(reply)
+
+    async def request(self, **request):
+        request["id"] = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request["id"]] = future
+        self.writer.write((json.dumps(request) + "\n").encode())
+        await self.writer.drain()
+        return await future
+
+    def close(self):
+        self.listener.cancel()
+        self.writer.close()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.games = 0
+        self.moves = 0
+        self.busy = 0
+        self.errors = 0
+
+
+async def player(connection, rng, time_ms, deadline, results):
+    """Plays games until the deadline, X moves at random and the server's AI replies as O"""
+    while time.perf_counter() < deadline:
+        game = await connection.request(op="new", time_ms=time_ms)
+        number = game["game"]
+        while not game["over"] and time.perf_counter() < deadline:
+            move = rng.choice(game["legal"])
+            start = time.perf_counter()
+            reply = await connection.request(op="move", game=number, move=move, reply=True)
+            backoff = 0.05
+            while reply.get("error") == "busy":
+                # Back off and ask for the AI's move again, the random move was already played
+                results.busy += 1
+                await asyncio.sleep(rng.uniform(backoff / 2, backoff))
+                backoff = min(2 * backoff, 2.0)
+                reply = await connection.request(op="ai", game=number)
+            if "error" in reply:
+                results.errors += 1
+                break
+            results.latencies.append(time.perf_counter() - start)
+            results.moves += 1
+            game = reply
+        if game["over"]:
+            results.games += 1
+        await connection.request(op="close", game=number)
+
+
+async def load(host, port, players, connections, duration, time_ms, seed):
+    rng = random.Random(seed)
+    pool = [await Connection.open(host, port) for i in range(connections)]
+    results = Results()
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(player(pool[i % connections], random.Random(rng.getrandbits(32)), time_ms, deadline,
+                                  results) for i in range(players)))
+    seconds = time.perf_counter() - start
+
+    server = await pool[0].request(op="stats")
+    for connection in pool:
+        connection.close()
+    return {"players": players, "connections": connections, "time_ms": time_ms, "seconds": seconds,
+            "games": results.games, "moves": results.moves, "moves_per_second": results.moves / seconds,
+            "busy": results.busy, "errors": results.errors,
+            "p50_ms": 1000 * percentile(results.latencies, 0.5), "p99_ms": 1000 * percentile(results.latencies, 0.99),
+            "server": server}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates many players against server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run for")
+    parser.add_argument("--time", type=int, default=5, help="AI think time asked for in milliseconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = asyncio.run(load(args.host, args.port, args.players, args.connections, args.duration, args.time,
+                               args.seed))
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Monte Carlo Tree Search (UCT) over the whole strategic tic-tac-toe game
+
+The tree is a pool of nodes held in flat arrays, a node is an index into them
+The children of a node are stored next to each other, so a node only needs its first child and child count
+Each leaf reached is scored with a batch of random playouts
+
+The tree is kept between searches. If the new position follows from the old root by moves already in the tree,
+that subtree is kept and the rest is dropped, so the moves searched under the opponent's reply are not lost
+"""
+
+import math
+import random
+import time
+from array import array
+
+from bitboard import FULL, MAX_MOVES, WINS, SQUARES
+from search import SearchResult
+from stats import SearchStats
+
+EXPLORATION = 1.4  # UCT exploration constant, about sqrt(2)
+MIN_NODES = MAX_MOVES + 1  # the root and every move from it, the smallest pool a search can work with
+
+
+class MCTS:
+    """
+    Searches with random playouts until the time budget runs out or the node pool is full
+    Scores returned are -1000 (certain loss) to 1000 (certain win) for the side to move
+    """
+    def __init__(self, time_ms=1000, max_nodes=200000, batch=4, exploration=EXPLORATION, seed=None):
+        if max_nodes < MIN_NODES:
+            raise ValueError("max_nodes must be at least {} to hold the root and its moves".format(MIN_NODES))
+        self.time_ms = time_ms
+        self.max_nodes = max_nodes
+        self.batch = batch  # playouts run from every new leaf
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+
+        self.root_moves = None  # moves played to reach the root, None if there is no tree
+        self.new_pool()
+
+        self.playouts = 0
+        self.seconds = 0.0
+        self.hooks = []
+        self.stats = SearchStats("mcts")
+
+    def add_hook(self, hook):
+        """Calls hook("done", stats) at the end of every search"""
+        self.hooks.append(hook)
+
+    def new_pool(self):
+        """Makes an empty node pool"""
+        size = self.max_nodes
+        self.parent = array("i", bytes(4 * size))
+        self.first = array("i", bytes(4 * size))  # index of the first child
+        self.count = array("b", bytes(size))  # number of children, 0 if not expanded
+        self.move = array("b", bytes(size))  # move that led to the node
+        self.visits = array("i", bytes(4 * size))
+        self.value = array("d", bytes(8 * size))  # total reward for the player who made the move
+        self.size = 1
+        self.parent[0] = -1
+        self.full = False  # an expansion found no room, set by iterate
+
+    @property
+    def playouts_per_second(self):
+        return self.playouts / self.seconds if self.seconds else 0.0
+
+    def search(self, state, time_ms=None, max_playouts=None, stop_event=None):
+        """
+        Searches the position and returns a SearchResult, the state is left as it was passed in
+        Stops early if stop_event (a threading.Event) is set
+        """
+        time_ms = self.time_ms if time_ms is None else time_ms
+        start = time.perf_counter()
+        deadline = start + time_ms / 1000 if time_ms else None
+
+        self.reuse(state)
+        self.stats = stats = SearchStats("mcts")
+        moves = state.legal_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0, stats)
+
+        self.playouts = 0
+        self.full = False
+        max_depth = 0
+        iterations = 0
+        while True:
+            max_depth = max(max_depth, self.iterate(state))
+            iterations += 1
+            if max_playouts is not None and self.playouts >= max_playouts:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+            # With no other limit, stop once a leaf has no room to expand. Every iteration that reaches an open leaf
+            # adds to the tree, so max_nodes iterations also end a search whose leaves are all finished games
+            if deadline is None and max_playouts is None and (self.full or iterations >= self.max_nodes):
+                break
+
+        # The most visited move is the most trusted
+        first = self.first[0]
+        best = max(range(first, first + self.count[0]), key=self.visits.__getitem__)
+        self.seconds = time.perf_counter() - start
+        score = int(2000 * self.value[best] / self.visits[best]) - 1000 if self.visits[best] else 0
+
+        stats.nodes = self.playouts
+        stats.max_depth = max_depth
+        stats.seconds = self.seconds
+        stats.tree_size = self.size
+        for hook in self.hooks:
+            hook("done", stats)
+        return SearchResult(self.move[best], score, max_depth, self.playouts, self.seconds, stats)
+
+    def reuse(self, state):
+        """Keeps the subtree for the position if it is in the tree, otherwise starts a new tree"""
+        moves = state.played()
+        if self.root_moves is not None and moves[:len(self.root_moves)] == self.root_moves:
+            node = 0
+            for move in moves[len(self.root_moves):]:
+                node = self.find_child(node, move)
+                if node is None:
+                    break
+            if node is not None:
+                if node:
+                    self.reroot(node)
+                self.root_moves = moves
+                return
+
+        self.new_pool()
+        self.root_moves = moves
+
+    def find_child(self, node, move):
+        """The child of node reached by move, None if it is not in the tree"""
+        first = self.first[node]
+        for child in range(first, first + self.count[node]):
+            if self.move[child] == move:
+                return child
+        return None
+
+    def reroot(self, node):
+        """Copies the subtree under node into a new pool with node as the root"""
+        old = (self.first, self.count, self.move, self.visits, self.value)
+        old_first, old_count, old_move, old_visits, old_value = old
+        self.new_pool()
+
+        self.move[0] = old_move[node]
+        self.visits[0] = old_visits[node]
+        self.value[0] = old_value[node]
+
+        queue = [(node, 0)]
+        size = 1
+        for old_node, new_node in queue:
+            count = old_count[old_node]
+            if not count:
+                continue
+
+            self.first[new_node] = size
+            self.count[new_node] = count
+            first = old_first[old_node]
+            for offset in range(count):
+                old_child = first + offset
+                child = size + offset
+                self.parent[child] = new_node
+                self.move[child] = old_move[old_child]
+                self.visits[child] = old_visits[old_child]
+                self.value[child] = old_value[old_child]
+                queue.append((old_child, child))
+            size += count
+
+        self.size = size
+
+    def iterate(self, state):
+        """Selects a leaf, expands it, runs a batch of playouts from it and backs up the result. Returns its depth"""
+        node = 0
+        depth = 0
+        log = math.log
+        sqrt = math.sqrt
+        visits = self.visits
+        value = self.value
+
+        # Selection, follow the highest UCT score until a leaf
+        while self.count[node]:
+            first = self.first[node]
+            log_parent = log(visits[node] or 1)
+            best = first
+            best_score = -1.0
+            for child in range(first, first + self.count[node]):
+                child_visits = visits[child]
+                if not child_visits:
+                    best = child
+                    break
+                score = value[child] / child_visits + self.exploration * sqrt(log_parent / child_visits)
+                if score > best_score:
+                    best_score = score
+                    best = child
+
+            node = best
+            state.play(self.move[node])
+            depth += 1
+
+        # Expansion, add every move of the leaf if there is room in the pool
+        if not WINS[state.macro[state.side ^ 1]]:
+            moves = state.legal_moves()
+            if moves and self.size + len(moves) > self.max_nodes:
+                self.full = True
+            elif moves:
+                first = self.size
+                self.first[node] = first
+                self.count[node] = len(moves)
+                for offset, move in enumerate(moves):
+                    self.parent[first + offset] = node
+                    self.move[first + offset] = move
+                self.size += len(moves)
+
+                node = first + self.rng.randrange(len(moves))
+                state.play(self.move[node])
+                depth += 1
+
+        # Simulation, rewards are for the player who made the last move
+        mover = state.side ^ 1
+        reward = 0.0
+        for playout in range(self.batch):
+            winner = self.playout(state)
+            if winner is None:
+                reward += 0.5
+            elif winner == mover:
+                reward += 1.0
+        self.playouts += self.batch
+
+        # Backpropagation, the reward flips between players at every level
+        for level in range(depth):
+            visits[node] += self.batch
+            value[node] += reward
+            reward = self.batch - reward
+            node = self.parent[node]
+            state.undo()
+        visits[node] += self.batch
+
+        return depth
+
+    def playout(self, state):
+        """Plays random moves to the end of the game, returns the winning side (0 or 1) or None, then undoes them"""
+        rng = self.rng
+        played = 0
+        while True:
+            if WINS[state.macro[state.side ^ 1]]:
+                winner = state.side ^ 1
+                break
+            closed = state.closed()
+            if closed == FULL:
+                winner = None
+                break
+
+            board = state.curr_board
+            if board is None:
+                board = rng.choice(SQUARES[FULL & ~closed])
+            state.play(board * 9 + rng.choice(SQUARES[state.open_squares(board)]))
+            played += 1
+
+        for move in range(played):
+            state.undo()
+        return winner
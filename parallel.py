@@ -0,0 +1,239 @@
+"""
+Alpha-beta search of a single move split across several processes at the root
+
+Each depth of the iterative deepening searches the best move of the last depth first, on its own, for a score to
+beat. Then the other root moves are spread over the pool and searched at the same time, each told that score
+Every process keeps its own Searcher and transposition table between moves of a game
+
+With no time limit (a fixed depth) every root move is searched with a table of its own, so the move and score do not
+depend on which process searched what, and a search gives the same result every run with any number of workers
+Rather than clearing the table, the hash of the position is xored with a new random salt for each root move. Every key
+under it changes the same way, so nothing stored before can be found and the old entries are replaced as stale
+The root moves get no help from each other's entries or from the last depth, so the time to depth printed by main
+is compared against a plain Searcher on one process as well as against one worker
+
+    python parallel.py --depth 7 --workers 1,2,4    time to each depth with 1, 2 and 4 workers
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import worker
+from records import replay
+from search import Searcher, SearchResult, INF, MATE, MAX_DEPTH, free_move_order, free_move_priority
+from stats import SearchStats
+from symmetry import unique_moves
+
+POLL = 0.005  # seconds between checks of the clock and stop event while waiting for the workers
+
+_salts = random.Random()  # salts that give each fixed depth root move a table of its own
+
+
+def search_root_move(job):
+    """Searches one root move in a worker, returns (move, score, stopped, nodes, deepest ply)"""
+    moves, move, depth, alpha, time_ms = job
+    state = replay(moves)
+    if not time_ms:
+        state.hash ^= _salts.getrandbits(64)  # a fresh table for this move without clearing it, see the docstring
+    searcher = worker.searcher
+    score = searcher.search_move(state, move, depth, alpha, time_ms, worker.stop)
+    return move, score, searcher.stopped, searcher.nodes, searcher.stats.max_depth
+
+
+class ParallelSearcher:
+    """
+    Same interface as search.Searcher, with the root moves searched across workers processes
+    The pool is started on the first search, call close() to end it
+    """
+    def __init__(self, time_ms=1000, workers=None, max_depth=MAX_DEPTH, tt_mb=16):
+        self.time_ms = time_ms
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_depth = max_depth
+        self.tt_mb = tt_mb
+        self.local = Searcher(time_ms, max_depth, tt_mb=1)  # orders moves for pondering
+        self.hooks = []
+        self.stats = SearchStats("parallel")
+        self.pool = None
+        self.stop = None
+
+    def add_hook(self, hook):
+        """Calls hook(event, stats) after every completed depth ("iteration") and at the end of a search ("done")"""
+        self.hooks.append(hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            hook(event, self.stats)
+
+    def order(self, state, moves, ply, tt_move=None):
+        return self.local.order(state, moves, ply, tt_move)
+
+    def start(self):
+        if self.pool is None:
+            self.stop = multiprocessing.Event()
+            self.pool = multiprocessing.Pool(self.workers, initializer=worker.start_worker,
+                                             initargs=(self.tt_mb, None, self.stop))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def wait(self, pending, deadline, stop_event):
+        """Waits for the async results, returns False if time ran out or stop_event was set first"""
+        for result in pending:
+            while not result.ready():
+                if ((deadline is not None and time.perf_counter() > deadline)
+                        or (stop_event is not None and stop_event.is_set())):
+                    self.stop.set()
+                    for other in pending:
+                        other.wait()
+                    self.stop.clear()
+                    return False
+                result.wait(POLL)
+        return True
+
+    def search(self, state, time_ms=None, max_depth=None, stop_event=None):
+        """Searches the position the same as Searcher.search, the state is left as it was passed in"""
+        time_ms = self.time_ms if time_ms is None else time_ms
+        max_depth = self.max_depth if max_depth is None else max_depth
+        self.start()
+
+        start = time.perf_counter()
+        deadline = start + time_ms / 1000 if time_ms else None
+        self.stats = stats = SearchStats("parallel")
+
+        moves = state.legal_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0, stats)
+        moves = unique_moves(state, moves)
+        moves = self.order(state, moves, 0)
+        priority = free_move_priority(state)
+        if priority is not None:
+            moves = free_move_order(moves, priority)
+        rank = {move: i for i, move in enumerate(moves)}  # the first order, used to break ties the same every run
+        played = state.played()
+
+        def higher(move, other):
+            """1 if move is on a board ranked higher than other's on a free move, else 0"""
+            return int(priority is not None and priority[move // 9] > priority[other // 9])
+
+        def remaining():
+            """Milliseconds left for a worker, 0 for no limit"""
+            return max(1, int(1000 * (deadline - time.perf_counter()))) if deadline is not None else 0
+
+        best = SearchResult(moves[0], 0, 0, 0, 0.0, stats)
+        nodes = 0
+        for depth in range(1, min(max_depth, 81 - state.turn_count) + 1):
+            iteration_start = nodes
+
+            # The move that was best on the last depth, alone, for a score the other moves have to beat
+            first = self.pool.apply_async(search_root_move, ((played, moves[0], depth, -INF, remaining()),))
+            finished = self.wait([first], deadline, stop_event)
+            move, alpha, stopped, searched, reached = first.get()
+            nodes += searched
+            stats.max_depth = max(stats.max_depth, reached)
+            scores = {move: alpha}
+            best_move = first_move = move
+
+            if finished and not stopped:
+                # As in Searcher.root, a move on a higher board than the first is searched so that a tie is exact
+                pending = []
+                for move in moves[1:]:
+                    bound = alpha - higher(move, first_move)
+                    job = (played, move, depth, bound, remaining())
+                    pending.append(self.pool.apply_async(search_root_move, (job,)))
+                finished = self.wait(pending, deadline, stop_event)
+                best_score = alpha
+                # In the first order, so a tie goes to the same move whichever worker finished first
+                for move, score, stopped_move, searched, reached in sorted((result.get() for result in pending),
+                                                                           key=lambda found: rank[found[0]]):
+                    nodes += searched
+                    stats.max_depth = max(stats.max_depth, reached)
+                    stopped = stopped or stopped_move
+                    scores[move] = score
+                    if score > best_score or (score == best_score and higher(move, best_move)):
+                        best_score = score
+                        best_move = move
+            else:
+                best_score = alpha
+            stopped = stopped or not finished
+
+            # A depth that did not finish is only used if there is no completed depth to fall back on
+            if stopped and best.depth > 0:
+                break
+            best = SearchResult(best_move, best_score, depth, nodes, time.perf_counter() - start, stats)
+            if stopped:
+                break
+
+            stats.depth = depth
+            stats.score = best_score
+            stats.iteration_nodes.append(nodes - iteration_start)
+            stats.iteration_seconds.append(time.perf_counter() - start)
+            stats.nodes = nodes
+            stats.seconds = time.perf_counter() - start
+            self.emit("iteration")
+            if abs(best_score) >= MATE or (stop_event is not None and stop_event.is_set()):
+                break
+
+            # The best move first, then the others by how close they came
+            moves.sort(key=lambda move: (move != best_move, -scores.get(move, -INF)))
+            if deadline is not None and time.perf_counter() + 2 * (time.perf_counter() - start) > deadline:
+                break
+
+        best.nodes = stats.nodes = nodes
+        best.seconds = stats.seconds = time.perf_counter() - start
+        self.emit("done")
+        return best
+
+
+def time_to_depth(state, depth, workers, tt_mb=4):
+    """Seconds to reach each depth with a fixed depth search on the given number of workers"""
+    searcher = ParallelSearcher(0, workers, tt_mb=tt_mb)
+    try:
+        searcher.search(state, 0, 1)  # starts the workers so their start up is not timed
+        result = searcher.search(state, 0, depth)
+    finally:
+        searcher.close()
+    return result, searcher.stats.iteration_seconds
+
+
+def main():
+    from bench import POSITIONS
+
+    parser = argparse.ArgumentParser(description="Time to depth of the parallel search for several worker counts")
+    parser.add_argument("--position", default="middle", choices=sorted(POSITIONS))
+    parser.add_argument("--depth", type=int, default=7)
+    parser.add_argument("--workers", default=None, help="comma separated worker counts, defaults to 1 up to every core")
+    args = parser.parse_args()
+
+    if args.workers is None:
+        counts = sorted({1, 2, 4, multiprocessing.cpu_count()})
+        counts = [count for count in counts if count <= multiprocessing.cpu_count()]
+    else:
+        counts = [int(count) for count in args.workers.split(",")]
+
+    state = replay(POSITIONS[args.position][0])
+
+    # The serial search keeps its table across root moves and depths, which the deterministic split gives up
+    Searcher(0, tt_mb=1).search(state, 0, 1)  # loads the lookup tables so they are not timed
+    serial = Searcher(0, tt_mb=4)
+    result = serial.search(state, 0, args.depth)
+    serial_seconds = serial.stats.iteration_seconds
+    print("serial search: move {} score {} nodes {}, seconds to depth {}".format(
+        result.move, result.score, result.nodes, " ".join("{:.3f}".format(s) for s in serial_seconds)))
+
+    base = None
+    for count in counts:
+        result, seconds = time_to_depth(state, args.depth, count)
+        base = base or seconds[-1]
+        print("{} workers: move {} score {} nodes {}, seconds to depth {}, speedup {:.2f} over 1 worker, "
+              "{:.2f} over the serial search".format(
+                  count, result.move, result.score, result.nodes, " ".join("{:.3f}".format(s) for s in seconds),
+                  base / seconds[-1], serial_seconds[-1] / seconds[-1]))
+
+
+if __name__ == '__main__':
+    main()
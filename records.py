@@ -0,0 +1,205 @@
+"""
+Compact binary game records
+
+A file starts with the 4 byte magic b"STR1", followed by records one after another:
+    1 byte   number of moves
+    1 byte   result, 0 for an X win, 1 for an O win, 2 for a draw (the same as GameState.result),
+             3 for a game that did not finish
+    4 bytes  seed, little-endian
+    2 bytes  length of the settings, little-endian
+    settings, UTF-8 JSON of the engine settings used for the game
+    one byte per move, the cell played (0-80)
+
+RecordWriter appends records as they come and RecordReader streams them back, neither holds more than one game
+RecordIndex memory-maps a file and finds any game by number, for sampling positions without reading everything
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from bitboard import GameState
+
+MAGIC = b"STR1"
+HEADER = struct.Struct("<BBIH")
+UNFINISHED = 3
+
+
+class GameRecord:
+    """One recorded game, offset is where it starts in its file"""
+    def __init__(self, moves, result, seed=0, settings=None, offset=None):
+        self.moves = moves
+        self.result = result
+        self.seed = seed
+        self.settings = settings or {}
+        self.offset = offset
+
+    def __repr__(self):
+        return "GameRecord(moves={}, result={}, seed={}, settings={})".format(
+            len(self.moves), self.result, self.seed, self.settings)
+
+
+def result_of(state):
+    """Result code for a finished or unfinished game"""
+    return UNFINISHED if state.result is None else state.result
+
+
+def encode(record):
+    """Bytes of one record"""
+    settings = json.dumps(record.settings, separators=(",", ":"), sort_keys=True).encode()
+    return HEADER.pack(len(record.moves), record.result, record.seed, len(settings)) + settings + bytes(record.moves)
+
+
+def decode(buffer, offset):
+    """Reads the record at offset in a bytes-like buffer, returns it and the offset of the next one"""
+    count, result, seed, settings_length = HEADER.unpack_from(buffer, offset)
+    start = offset + HEADER.size
+    settings = json.loads(bytes(buffer[start:start + settings_length])) if settings_length else {}
+    start += settings_length
+    moves = list(buffer[start:start + count])
+    return GameRecord(moves, result, seed, settings, offset), start + count
+
+
+def replay(moves, ply=None):
+    """The position after the first ply of moves (cells, in the order played), after all of them if ply is None"""
+    state = GameState()
+    for move in moves[:ply]:
+        state.play(move)
+    return state
+
+
+class RecordWriter:
+    """Appends records to a file, writing the magic first if the file is new"""
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(MAGIC)
+
+    def write(self, record):
+        """Writes a GameRecord, returns the offset it was written at"""
+        offset = self.file.tell()
+        self.file.write(encode(record))
+        return offset
+
+    def write_game(self, state, seed=0, settings=None):
+        """Records a game from its GameState"""
+        return self.write(GameRecord(state.played(), result_of(state), seed, settings))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordReader:
+    """Streams the records of a file one at a time"""
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(path + " is not a game record file")
+
+    def __iter__(self):
+        while True:
+            offset = self.file.tell()
+            header = self.file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            count, result, seed, settings_length = HEADER.unpack(header)
+            settings = self.file.read(settings_length)
+            moves = self.file.read(count)
+            if len(moves) < count:
+                return  # the last record was cut short, for example by a crash while writing
+            yield GameRecord(list(moves), result, seed, json.loads(settings) if settings_length else {}, offset)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordIndex:
+    """
+    Random access to the games of a file through a memory map
+    The offsets of the games are found by walking the headers once, or loaded from path + ".idx" if it is up to date
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(path + " is not a game record file")
+
+        self.offsets = self.load_index()
+        if self.offsets is None:
+            self.offsets = self.scan()
+
+    def scan(self):
+        offsets = array("Q")
+        offset = len(MAGIC)
+        end = len(self.map)
+        while offset + HEADER.size <= end:
+            count, result, seed, settings_length = HEADER.unpack_from(self.map, offset)
+            following = offset + HEADER.size + settings_length + count
+            if following > end:
+                break
+            offsets.append(offset)
+            offset = following
+        return offsets
+
+    def load_index(self):
+        index_path = self.path + ".idx"
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(self.path):
+            return None
+        offsets = array("Q")
+        with open(index_path, "rb") as file:
+            offsets.frombytes(file.read())
+        return offsets
+
+    def save_index(self):
+        """Saves the offsets next to the file so the next RecordIndex does not have to walk it"""
+        with open(self.path + ".idx", "wb") as file:
+            self.offsets.tofile(file)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, game):
+        return decode(self.map, self.offsets[game])[0]
+
+    def position(self, game, ply):
+        """The position after ply moves of a game"""
+        return replay(self[game].moves, ply)
+
+    def sample(self, count, rng):
+        """Picks count random positions from random games, returns (record, ply) pairs"""
+        samples = []
+        for i in range(count):
+            record = self[rng.randrange(len(self.offsets))]
+            samples.append((record, rng.randrange(len(record.moves) + 1)))
+        return samples
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
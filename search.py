@@ -0,0 +1,378 @@
+"""
+Alpha-beta search over the whole strategic tic-tac-toe game
+Uses iterative deepening so a move is always ready when the time budget runs out
+A transposition table is kept between searches so later moves of a game reuse earlier work
+Every result carries a stats.SearchStats, and hooks added with add_hook are called as the search goes
+With a tablebase.Tablebase, late positions it holds are scored exactly instead of searched
+"""
+
+import time
+
+from bitboard import WINS
+from evaluate import WIN, evaluate, send_penalty, macro_priority
+from ttable import TranspositionTable, EXACT, LOWER, UPPER
+from subtable import BASE3, get_table
+from stats import SearchStats, profiled
+from symmetry import unique_moves
+import tablebase as tb
+
+MAX_DEPTH = 81  # there are never more than 81 moves left
+INF = WIN + 1000
+MATE = WIN - MAX_DEPTH  # scores past this are wins or losses found by the search
+
+CHECK_EVERY = 1024  # nodes between checks of the clock
+
+
+class SearchResult:
+    """What a search found: the best move (cell 0-80), its score for the side to move, and how far it looked"""
+    def __init__(self, move, score, depth, nodes, seconds, stats=None):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.stats = stats  # SearchStats with the details
+
+    def __repr__(self):
+        return "SearchResult(move={}, score={}, depth={}, nodes={}, seconds={:.3f})".format(
+            self.move, self.score, self.depth, self.nodes, self.seconds)
+
+
+class Searcher:
+    """
+    Negamax alpha-beta search with iterative deepening
+    Moves are ordered by small board wins and blocks, killer moves, the history heuristic,
+    and last by how bad the board they send the opponent to is
+    On a free move the root moves are grouped by board, the boards that matter most on the macro board first
+
+    timing measures the time spent generating moves and evaluating, at some cost to speed
+    profile runs every search under cProfile and puts the report in its stats
+    tablebase is a tablebase.Tablebase probed at the root and at every position late enough to be in it
+    """
+    def __init__(self, time_ms=1000, max_depth=MAX_DEPTH, tt=None, tt_mb=16, timing=False, profile=False,
+                 tablebase=None):
+        self.time_ms = time_ms
+        self.max_depth = max_depth
+        self.tt = TranspositionTable(tt_mb) if tt is None else tt
+        self.timing = timing
+        self.profile = profile
+        self.tablebase = tablebase
+        self.hooks = []
+        self.stats = SearchStats("alphabeta")
+
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = None  # threading.Event that stops the search early when set
+        self.max_nodes = 0  # nodes the search stops after, 0 for no limit
+        self.stopped = False
+
+        self.killers = [[None, None] for ply in range(MAX_DEPTH + 1)]
+        self.history = [[0] * 81, [0] * 81]
+
+    def add_hook(self, hook):
+        """Calls hook(event, stats) after every completed depth ("iteration") and at the end of a search ("done")"""
+        self.hooks.append(hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            hook(event, self.stats)
+
+    def search(self, state, time_ms=None, max_depth=None, stop_event=None, max_nodes=0):
+        """
+        Searches the position until the time budget (milliseconds) runs out, max_depth is reached, stop_event is set
+        or about max_nodes have been visited (checked every CHECK_EVERY nodes, 0 for no limit)
+        The state is left as it was passed in
+        """
+        if self.profile:
+            result, report = profiled(self.run, state, time_ms, max_depth, stop_event, max_nodes)
+            result.stats.profile = report
+        else:
+            result = self.run(state, time_ms, max_depth, stop_event, max_nodes)
+
+        self.emit("done")
+        return result
+
+    def run(self, state, time_ms, max_depth, stop_event, max_nodes=0):
+        time_ms = self.time_ms if time_ms is None else time_ms
+        max_depth = self.max_depth if max_depth is None else max_depth
+
+        start = time.perf_counter()
+        self.deadline = start + time_ms / 1000 if time_ms else None
+        self.stop_event = stop_event
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.stopped = False
+        self.stats = stats = SearchStats("alphabeta")
+        tt_hits = self.tt.hits
+        tt_probes = self.tt.hits + self.tt.misses
+        self.tt.new_search()
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        for history in self.history:  # older searches count for less
+            for move in range(81):
+                history[move] >>= 2
+
+        moves = state.legal_moves()
+        if not moves:
+            return SearchResult(None, evaluate(state), 0, 0, 0.0, stats)
+        moves = unique_moves(state, moves)  # moves that are mirror images of one another score the same
+        priority = free_move_priority(state)
+        if priority is not None:
+            moves = free_move_order(self.order(state, moves, 0), priority)
+
+        # A position in the tablebase needs no search, its best move is known
+        if self.tablebase is not None:
+            found = self.tablebase.best_move(state)
+            if found is not None:
+                move, (result, distance) = found
+                stats.tb_hits += 1
+                stats.seconds = time.perf_counter() - start
+                return SearchResult(move, tb_score(result, distance, 0), distance, 0, stats.seconds, stats)
+
+        best = SearchResult(moves[0], 0, 0, 0, 0.0, stats)
+        for depth in range(1, min(max_depth, 81 - state.turn_count) + 1):
+            iteration_start = self.nodes
+            score, move = self.root(state, moves, depth, priority)
+
+            # A search that ran out of time is only trusted if it has no completed depth to fall back on
+            if self.stopped and best.depth > 0:
+                break
+
+            best = SearchResult(move, score, depth, self.nodes, time.perf_counter() - start, stats)
+            if not self.stopped:
+                stats.depth = depth
+                stats.score = score
+                stats.iteration_nodes.append(self.nodes - iteration_start)
+                stats.iteration_seconds.append(time.perf_counter() - start)
+                stats.nodes = self.nodes
+                stats.seconds = time.perf_counter() - start
+                self.emit("iteration")
+            if self.stopped or abs(score) >= MATE or (stop_event is not None and stop_event.is_set()):
+                break
+
+            # Search the best move first on the next depth
+            moves.remove(move)
+            moves.insert(0, move)
+
+            # The next depth takes several times longer than this one, do not start it if it cannot finish
+            if self.deadline is not None and time.perf_counter() + 2 * (time.perf_counter() - start) > self.deadline:
+                break
+
+        best.nodes = stats.nodes = self.nodes
+        best.seconds = stats.seconds = time.perf_counter() - start
+        stats.tt_hits = self.tt.hits - tt_hits
+        stats.tt_probes = self.tt.hits + self.tt.misses - tt_probes
+        return best
+
+    def root(self, state, moves, depth, priority=None):
+        """
+        Searches every root move, returns the best score and move
+        On a free move priority maps each board to its macro_priority, and of moves with the same score the one on
+        the higher board is picked
+        """
+        alpha = -INF
+        best_move = moves[0]
+        for move in moves:
+            # One below alpha, so a tie on a higher board gets its exact score instead of a bound
+            bound = alpha - 1 if priority is not None and priority[move // 9] > priority[best_move // 9] else alpha
+            state.play(move)
+            score = -self.negamax(state, depth - 1, -INF, -bound, 1)
+            state.undo()
+
+            if self.stopped:
+                break
+            if score > alpha or (score == alpha and bound < alpha):
+                alpha = score
+                best_move = move
+
+        if not self.stopped:
+            self.tt.store(state.hash, depth, EXACT, to_tt(alpha, 0), best_move)
+        return alpha, best_move
+
+    def search_move(self, state, move, depth, alpha=-INF, time_ms=0, stop_event=None):
+        """
+        Searches a single root move to depth and returns its score for the side to move, for splitting the root
+        between processes. Scores at or below alpha only mean the move is no better than alpha
+        self.stopped is set if the time (milliseconds, 0 for none) ran out or stop_event was set first
+        """
+        self.deadline = time.perf_counter() + time_ms / 1000 if time_ms else None
+        self.stop_event = stop_event
+        self.max_nodes = 0
+        self.nodes = 0
+        self.stopped = False
+        self.stats = SearchStats("alphabeta")
+        self.tt.new_search()
+
+        state.play(move)
+        score = -self.negamax(state, depth - 1, -INF, -alpha, 1)
+        state.undo()
+        return score
+
+    def negamax(self, state, depth, alpha, beta, ply):
+        """Returns the score of the position for the side to move"""
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            if ((self.deadline is not None and time.perf_counter() > self.deadline)
+                    or (self.stop_event is not None and self.stop_event.is_set())
+                    or (self.max_nodes and self.nodes >= self.max_nodes)):
+                self.stopped = True
+        if self.stopped:
+            return 0
+
+        stats = self.stats
+        if ply > stats.max_depth:
+            stats.max_depth = ply
+
+        # Only the player who just moved can have won
+        if WINS[state.macro[state.side ^ 1]]:
+            return ply - WIN
+
+        if self.timing:
+            start = time.perf_counter()
+            moves = state.legal_moves()
+            stats.movegen_seconds += time.perf_counter() - start
+        else:
+            moves = state.legal_moves()
+        if not moves:
+            return 0  # every board is closed and no one won
+        if self.tablebase is not None:
+            found = self.tablebase.probe(state)
+            if found is not None:
+                stats.tb_hits += 1
+                return tb_score(found[0], found[1], ply)
+        if depth == 0:
+            stats.evals += 1
+            if self.timing:
+                start = time.perf_counter()
+                score = evaluate(state)
+                stats.eval_seconds += time.perf_counter() - start
+                return score
+            return evaluate(state)
+
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.probe(state.hash)
+        if entry is not None:
+            tt_depth, flag, score, tt_move = entry
+            if tt_depth >= depth:
+                score = from_tt(score, ply)
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    stats.tt_cutoffs += 1
+                    return score
+
+        if self.timing:
+            start = time.perf_counter()
+            moves = self.order(state, moves, ply, tt_move)
+            stats.movegen_seconds += time.perf_counter() - start
+        else:
+            moves = self.order(state, moves, ply, tt_move)
+
+        best = -INF
+        best_move = None
+        for move in moves:
+            state.play(move)
+            score = -self.negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            state.undo()
+
+            if self.stopped:
+                return 0
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        stats.cutoffs += 1
+                        self.store_cutoff(state.side, move, depth, ply)
+                        break
+
+        if best >= beta:
+            flag = LOWER
+        elif best <= alpha_orig:
+            flag = UPPER
+        else:
+            flag = EXACT
+        self.tt.store(state.hash, depth, flag, to_tt(best, ply), best_move)
+
+        return best
+
+    def order(self, state, moves, ply, tt_move=None):
+        """Sorts moves so the ones most likely to cause a cutoff are searched first"""
+        side = state.side
+        own = state.boards[side]
+        opp = state.boards[side ^ 1]
+        killers = self.killers[ply]
+        history = self.history[side]
+        best = get_table().best[side]
+
+        keyed = []
+        for move in moves:
+            board, square = divmod(move, 9)
+            bit = 1 << square
+            key = history[move]
+            if move == tt_move:
+                key += 1 << 46  # best move the last time this position was searched
+            if WINS[own[board] | bit]:
+                key += 1 << 44  # wins a small board
+            elif WINS[opp[board] | bit]:
+                key += 1 << 43  # stops the opponent winning a small board
+            if move == killers[0] or move == killers[1]:
+                key += 1 << 42
+            if best[BASE3[state.boards[0][board]] + 2 * BASE3[state.boards[1][board]]] & bit:
+                key += 1 << 30  # perfect play on the small board on its own
+            key -= send_penalty(state, square) << 40
+            keyed.append((key, move))
+
+        keyed.sort(reverse=True)
+        return [move for key, move in keyed]
+
+    def store_cutoff(self, side, move, depth, ply):
+        """Remembers a move that caused a cutoff as a killer for this ply and in the history table"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[side][move] += depth * depth
+
+
+def free_move_priority(state):
+    """macro_priority of every open board when the side to move has a free move, None when it is sent to a board"""
+    if state.curr_board is not None:
+        return None
+    return {board: macro_priority(state, board) for board in state.legal_boards()}
+
+
+def free_move_order(moves, priority):
+    """
+    Orders the root moves of a free move by board, the boards that matter most on the macro board first
+    Moves keep their order within a board. The best board is searched first, so it sets the bound the other boards
+    have to beat
+    """
+    return sorted(moves, key=lambda move: -priority[move // 9])
+
+
+def tb_score(result, distance, ply):
+    """Search score of a tablebase result, a win or loss distance moves after ply"""
+    if result == tb.WIN:
+        return WIN - ply - distance
+    elif result == tb.LOSS:
+        return ply + distance - WIN
+    return 0
+
+
+def to_tt(score, ply):
+    """Stores wins and losses as distance from the position rather than from the root"""
+    if score >= MATE:
+        return score + ply
+    elif score <= -MATE:
+        return score - ply
+    return score
+
+
+def from_tt(score, ply):
+    """Turns a stored win or loss back into distance from the root"""
+    if score >= MATE:
+        return score - ply
+    elif score <= -MATE:
+        return score + ply
+    return score
@@ -0,0 +1,189 @@
+"""
+Self-play and tournament runner, plays many games headlessly across a pool of processes
+
+Players are given as specs:
+    random                      picks a random open board, then a random open square on it
+    ai                          the alpha-beta search with its default settings
+    ai:time=200,depth=6,tt=4    think time in milliseconds (0 for no limit), max depth, transposition table megabytes
+    mcts:time=200,nodes=100000  Monte Carlo Tree Search with its think time, node pool size
+                                and playouts per leaf (batch)
+
+Example, 200 games of the AI against the random player on every core:
+    python selfplay.py --games 200 --a ai:time=100 --b random --out results.jsonl
+
+Player a plays X in even games and O in odd games. Every finished game is written to the output file as one JSON line
+and, with --records, to a binary game record file (see records.py)
+A summary with the win/draw/loss record of player a, an Elo estimate and the throughput is printed at the end
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from bitboard import GameState, SQUARES, PLAYERS
+from search import Searcher, MAX_DEPTH
+from mcts import MCTS, MIN_NODES
+from records import RecordWriter, GameRecord
+
+SETTINGS = {"ai": ("time", "depth", "tt"), "random": (), "mcts": ("time", "nodes", "batch")}
+
+
+def parse_spec(spec):
+    """Turns a player spec like "ai:time=200,depth=6" into a dict of settings"""
+    kind, _, options = spec.partition(":")
+    if kind not in SETTINGS:
+        raise ValueError("unknown player: " + kind)
+
+    settings = {"kind": kind}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in SETTINGS[kind]:
+            raise ValueError("unknown setting for " + kind + ": " + key)
+        settings[key] = int(value)
+    if kind == "mcts" and settings.get("nodes", MIN_NODES) < MIN_NODES:
+        raise ValueError("mcts needs nodes of at least " + str(MIN_NODES))
+    return settings
+
+
+def random_move(state, rng):
+    """Baseline player, picks a random open board it may play on and a random open square on that board"""
+    board = rng.choice(state.legal_boards())
+    return board * 9 + rng.choice(SQUARES[state.open_squares(board)])
+
+
+class Player:
+    """One side of a game, either one of the searches or the random baseline"""
+    def __init__(self, settings, rng):
+        self.settings = settings
+        self.rng = rng
+        self.searcher = None
+        if settings["kind"] == "ai":
+            self.searcher = Searcher(settings.get("time", 100), settings.get("depth", MAX_DEPTH),
+                                     tt_mb=settings.get("tt", 4))
+        elif settings["kind"] == "mcts":
+            self.searcher = MCTS(settings.get("time", 100), settings.get("nodes", 100000), settings.get("batch", 4),
+                                 seed=rng.getrandbits(32))
+
+    def move(self, state):
+        if self.searcher is None:
+            return random_move(state, self.rng)
+        return self.searcher.search(state).move
+
+
+def play_game(job):
+    """Plays one game, returns its record as a dict. Runs in a worker process"""
+    game, a_settings, b_settings, seed = job
+    rng = random.Random(seed)
+
+    # Player a is X in even games
+    players = [Player(a_settings, rng), Player(b_settings, rng)]
+    if game % 2:
+        players.reverse()
+
+    state = GameState()
+    moves = []
+    think = [0.0, 0.0]
+    while not state.is_over():
+        side = state.side
+        start = time.perf_counter()
+        move = players[side].move(state)
+        think[side] += time.perf_counter() - start
+        state.play(move)
+        moves.append(move)
+
+    winner = state.winner()
+    a_side = "X" if game % 2 == 0 else "O"
+    if winner is None:
+        result = "draw"
+    elif winner == a_side:
+        result = "win"
+    else:
+        result = "loss"
+
+    x_moves = (len(moves) + 1) // 2
+    o_moves = len(moves) // 2
+    return {"game": game, "seed": seed, "a": a_side, "winner": winner, "result": result, "moves": moves,
+            "move_count": len(moves),
+            "think_ms": {PLAYERS[0]: 1000 * think[0] / max(x_moves, 1), PLAYERS[1]: 1000 * think[1] / max(o_moves, 1)}}
+
+
+def elo(wins, draws, losses):
+    """Elo difference of player a over player b from their score, clamped so a perfect score stays finite"""
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score = (wins + draws / 2) / games
+    score = min(max(score, 0.5 / games), 1 - 0.5 / games)
+    return -400 * math.log10(1 / score - 1)
+
+
+def run(games, a_spec, b_spec, workers=None, out=None, seed=0, records=None):
+    """
+    Plays the games across a process pool, streams them to out (a file or None)
+    and records (a RecordWriter or None), returns the summary dict
+    """
+    a_settings = parse_spec(a_spec)
+    b_settings = parse_spec(b_spec)
+    jobs = [(game, a_settings, b_settings, seed + game) for game in range(games)]
+    workers = workers or multiprocessing.cpu_count()
+
+    record = {"win": 0, "draw": 0, "loss": 0}
+    total_moves = 0
+    a_think = 0.0
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(workers) as pool:
+        # Several games per task keeps the pool busy without waiting on the main process for short games
+        for result in pool.imap_unordered(play_game, jobs, chunksize=max(1, games // (workers * 16))):
+            record[result["result"]] += 1
+            total_moves += result["move_count"]
+            a_think += result["think_ms"][result["a"]]
+            if out is not None:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+            if records is not None:
+                x_spec, o_spec = (a_spec, b_spec) if result["a"] == "X" else (b_spec, a_spec)
+                code = {"X": 0, "O": 1, None: 2}[result["winner"]]
+                records.write(GameRecord(result["moves"], code, result["seed"], {"X": x_spec, "O": o_spec}))
+
+    seconds = time.perf_counter() - start
+    return {"a": a_spec, "b": b_spec, "games": games, "workers": workers,
+            "wins": record["win"], "draws": record["draw"], "losses": record["loss"],
+            "elo": elo(record["win"], record["draw"], record["loss"]),
+            "moves_per_game": total_moves / games if games else 0.0,
+            "a_think_ms": a_think / games if games else 0.0,
+            "seconds": seconds, "games_per_second": games / seconds if seconds else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays strategic tic-tac-toe games between two players")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--a", default="ai", help="player spec for player a")
+    parser.add_argument("--b", default="random", help="player spec for player b")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use, defaults to every core")
+    parser.add_argument("--out", default=None, help="JSONL file for the games, defaults to none")
+    parser.add_argument("--records", default=None, help="binary game record file to append the games to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    records = None if args.records is None else RecordWriter(args.records)
+    try:
+        if args.out is None:
+            summary = run(args.games, args.a, args.b, args.workers, None, args.seed, records)
+        else:
+            with open(args.out, "a") as out:
+                summary = run(args.games, args.a, args.b, args.workers, out, args.seed, records)
+    finally:
+        if records is not None:
+            records.close()
+
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
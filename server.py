@@ -0,0 +1,226 @@
+"""
+Game server, holds many games at once and plays the AI side of each of them
+
+    python server.py --port 8765 --workers 4
+
+Clients connect over TCP and send one JSON object per line, every reply is one JSON line with the same "id":
+    {"id": 1, "op": "new", "time_ms": 100}        starts a game, replies with its "game" number
+                                                  time_ms is capped at --max-time and must be above 0
+    {"id": 2, "op": "move", "game": 0, "move": 40, "reply": true}
+                                                  plays a move, with "reply" the AI answers it in the same request
+    {"id": 3, "op": "ai", "game": 0}              the AI plays the side to move
+    {"id": 4, "op": "get", "game": 0}             the game as it stands
+    {"id": 5, "op": "close", "game": 0}           forgets the game
+    {"id": 6, "op": "stats"}                      games in flight, searches queued and move latency
+Replies about a game carry its "moves", "legal" moves, "player" to move, "over" and "winner"
+Errors are replied as {"id": ..., "error": "..."}, "busy" means the search queue is full and the request can be retried
+
+Searches run in a pool of worker processes, each with its own Searcher kept between requests
+At most max_queue searches wait for a worker at once, past that requests are turned away instead of queueing forever
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import worker
+from bitboard import GameState
+from records import replay
+
+MAX_QUEUE = 1024
+TIME_MS = 100
+MAX_TIME_MS = 5000
+LATENCIES = 10000  # moves kept for the latency percentiles
+
+def search_moves(moves, time_ms):
+    """Runs in a worker, searches the position reached by moves and returns the best move"""
+    return worker.searcher.search(replay(moves), time_ms).move
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Session:
+    """One game, only its moves and time budget are kept, the position is replayed from them when needed"""
+    __slots__ = ("moves", "time_ms", "searching")
+
+    def __init__(self, time_ms):
+        self.moves = bytearray()
+        self.time_ms = time_ms
+        self.searching = False  # a search for this game is queued or running
+
+    def state(self):
+        return replay(self.moves)
+
+
+class Server:
+    def __init__(self, workers=None, max_queue=MAX_QUEUE, time_ms=TIME_MS, max_time_ms=MAX_TIME_MS, tt_mb=4):
+        self.pool = ProcessPoolExecutor(workers, initializer=worker.start_worker, initargs=(tt_mb,))
+        self.max_queue = max_queue
+        self.time_ms = time_ms
+        self.max_time_ms = max_time_ms
+
+        self.sessions = {}
+        self.next_game = 0
+        self.queued = 0  # searches sent to the pool and not finished
+        self.latencies = deque(maxlen=LATENCIES)  # seconds from receiving a request to having the AI's move
+        self.moves_served = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+    def stats(self):
+        latencies = list(self.latencies)
+        seconds = time.perf_counter() - self.started
+        return {"games": len(self.sessions), "queued": self.queued, "moves_served": self.moves_served,
+                "rejected": self.rejected, "p50_ms": 1000 * percentile(latencies, 0.5),
+                "p99_ms": 1000 * percentile(latencies, 0.99),
+                "moves_per_second": self.moves_served / seconds if seconds else 0.0}
+
+    def describe(self, game, session, state):
+        winner = state.winner()
+        return {"game": game, "moves": list(session.moves), "legal": state.legal_moves(), "player": state.player,
+                "over": state.is_over(), "winner": winner}
+
+    async def ai_move(self, session, state, received):
+        """Searches in the pool and plays the AI's move, returns an error string or None"""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            return "busy"
+
+        session.searching = True
+        self.queued += 1
+        try:
+            loop = asyncio.get_running_loop()
+            move = await loop.run_in_executor(self.pool, search_moves, bytes(session.moves), session.time_ms)
+        finally:
+            self.queued -= 1
+            session.searching = False
+
+        state.play(move)
+        session.moves.append(move)
+        self.latencies.append(time.perf_counter() - received)
+        self.moves_served += 1
+        return None
+
+    async def handle(self, request):
+        received = time.perf_counter()
+        op = request.get("op")
+        if op == "stats":
+            return self.stats()
+
+        if op == "new":
+            time_ms = min(int(request.get("time_ms", self.time_ms)), self.max_time_ms)
+            if time_ms <= 0:
+                return {"error": "time_ms must be positive, a search with no time limit would never end"}
+            game = self.next_game
+            self.next_game += 1
+            session = self.sessions[game] = Session(time_ms)
+            return self.describe(game, session, GameState())
+
+        game = request.get("game")
+        session = self.sessions.get(game)
+        if session is None:
+            return {"error": "no such game: " + str(game)}
+        if op == "close":
+            del self.sessions[game]
+            return {"game": game}
+        if op not in ("get", "move", "ai"):
+            return {"error": "unknown op: " + str(op)}
+        if op != "get" and session.searching:
+            return {"error": "the AI is still thinking"}
+
+        state = session.state()
+        if op == "move":
+            move = request.get("move")
+            # true and 1.0 compare equal to the cell 1, so the type is checked before the move is looked up
+            if not isinstance(move, int) or isinstance(move, bool) or move not in state.legal_moves():
+                return {"error": "illegal move: " + json.dumps(move)}
+            state.play(move)
+            session.moves.append(move)
+        if (op == "ai" or request.get("reply")) and not state.is_over():
+            error = await self.ai_move(session, state, received)
+            if error is not None:
+                reply = self.describe(game, session, state)
+                reply["error"] = error
+                return reply
+        return self.describe(game, session, state)
+
+    async def respond(self, request, writer):
+        try:
+            reply = await self.handle(request)
+        except Exception as error:
+            reply = {"error": str(error)}
+        reply["id"] = request.get("id")
+        writer.write((json.dumps(reply) + "\n").encode())
+
+    async def client(self, reader, writer):
+        """Serves one connection, its requests are handled concurrently and replied to as they finish"""
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    writer.write(b'{"id": null, "error": "bad JSON"}\n')
+                    continue
+                task = asyncio.ensure_future(self.respond(request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def report(self, every):
+        while True:
+            await asyncio.sleep(every)
+            print(json.dumps(self.stats()), file=sys.stderr)
+
+    async def serve(self, host, port, report=0):
+        server = await asyncio.start_server(self.client, host, port, limit=1 << 16)
+        if report:
+            asyncio.ensure_future(self.report(report))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves strategic tic-tac-toe games against the AI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="search processes, defaults to every core")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE, help="searches that may wait for a worker")
+    parser.add_argument("--time", type=int, default=TIME_MS, help="default think time in milliseconds")
+    parser.add_argument("--max-time", type=int, default=MAX_TIME_MS, help="longest think time a game may ask for")
+    parser.add_argument("--tt", type=int, default=4, help="transposition table megabytes per worker")
+    parser.add_argument("--report", type=float, default=10, help="seconds between stats lines on stderr, 0 for none")
+    args = parser.parse_args()
+
+    server = Server(args.workers, args.max_queue, args.time, args.max_time, args.tt)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.report))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Images for the pygame window, made once for each size and kept
+
+The X and O images are large, so the first time a size is asked for they are scaled down and the small copy is saved
+in .sprite_cache next to this file. Later runs load the small copy instead of decoding and scaling the full image
+The empty grid is drawn once for each window size
+
+Only the GUI imports this, so nothing else pays for importing pygame
+"""
+
+import os
+
+import pygame as pg
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CACHE = os.path.join(DIRECTORY, ".sprite_cache")
+
+_sprites = {}  # (image name, size, via) -> Surface
+_grids = {}  # window size -> Surface
+
+
+def sprite(name, size, via=None):
+    """
+    The image in file name scaled to size x size pixels, converted for fast drawing once the window is open
+    via scales it to that size first, so a small copy looks the same as one scaled down from a larger one
+    """
+    key = (name, size, via)
+    if key not in _sprites:
+        source = os.path.join(DIRECTORY, name)
+        stem = os.path.splitext(name)[0]
+        # Scaling through another size gives other pixels, so that copy is saved apart from the direct one
+        suffix = "" if via is None else "_via{}".format(via)
+        cached = os.path.join(CACHE, "{}_{}{}.png".format(stem, size, suffix))
+        if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(source):
+            image = pg.image.load(cached)
+        else:
+            image = pg.image.load(source)
+            if via is not None:
+                image = pg.transform.scale(image, (via, via))
+            image = pg.transform.scale(image, (size, size))
+            try:
+                os.makedirs(CACHE, exist_ok=True)
+                pg.image.save(image, cached)
+            except (OSError, pg.error):
+                pass  # a read-only install scales it again next time
+        if pg.display.get_surface() is not None:
+            image = image.convert_alpha()
+        _sprites[key] = image
+    return _sprites[key]
+
+
+def grid(size, rows=3):
+    """The empty board for a window of size x size pixels, thin lines between squares and thick ones between boards"""
+    if size not in _grids:
+        surface = pg.Surface((size, size))
+        surface.fill((255, 255, 255))
+        black = (0, 0, 0)
+        spacing = (size // rows) // rows
+        for i in range(rows * rows):
+            x = i * spacing
+            width = 3 if i and i % rows == 0 else 1
+            pg.draw.line(surface, black, (x, 0), (x, size), width)
+            pg.draw.line(surface, black, (0, x), (size, x), width)
+        if pg.display.get_surface() is not None:
+            surface = surface.convert()
+        _grids[size] = surface
+    return _grids[size]
@@ -0,0 +1,69 @@
+"""
+Statistics about a single search, returned with its result so they can be logged or sent to metrics
+
+Hooks are plain callables taking (event, stats), added to a searcher with add_hook
+Events are "iteration" after each completed depth of alpha-beta and "done" at the end of every search
+"""
+
+
+class SearchStats:
+    """Counters for one search, times are in seconds"""
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.nodes = 0  # positions visited, playouts for MCTS
+        self.evals = 0  # positions scored by the evaluation at the end of the depth
+        self.cutoffs = 0  # beta cutoffs from searching a move
+        self.tt_cutoffs = 0  # positions answered by the transposition table without searching
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tb_hits = 0  # positions scored by the endgame tablebase
+        self.depth = 0  # deepest completed iteration
+        self.score = 0  # score of the best move of the deepest completed iteration
+        self.max_depth = 0  # deepest position reached
+        self.iteration_nodes = []  # nodes used by each completed iteration
+        self.iteration_seconds = []  # time from the start of the search to the end of each completed iteration
+        self.seconds = 0.0
+        self.movegen_seconds = 0.0  # only measured when the searcher's timing is on
+        self.eval_seconds = 0.0  # only measured when the searcher's timing is on
+        self.tree_size = 0  # MCTS only
+        self.profile = None  # text of the cProfile report when the search was profiled
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def branching_factor(self):
+        """Effective branching factor, how many times more nodes the last iteration took than the one before"""
+        if len(self.iteration_nodes) < 2 or not self.iteration_nodes[-2]:
+            return 0.0
+        return self.iteration_nodes[-1] / self.iteration_nodes[-2]
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        """The stats as a dict of plain values, for JSON"""
+        return {"algorithm": self.algorithm, "nodes": self.nodes, "evals": self.evals, "cutoffs": self.cutoffs,
+                "tt_cutoffs": self.tt_cutoffs, "tt_hit_rate": self.tt_hit_rate, "tb_hits": self.tb_hits,
+                "depth": self.depth, "score": self.score, "max_depth": self.max_depth,
+                "branching_factor": self.branching_factor, "seconds": self.seconds,
+                "nodes_per_second": self.nodes_per_second, "movegen_seconds": self.movegen_seconds,
+                "eval_seconds": self.eval_seconds, "tree_size": self.tree_size}
+
+    def __repr__(self):
+        return "SearchStats(" + ", ".join(key + "=" + str(value) for key, value in self.as_dict().items()) + ")"
+
+
+def profiled(function, *args, **kwargs):
+    """Runs function under cProfile, returns its result and the report sorted by cumulative time"""
+    import cProfile  # only imported when asked for, it is slow to import and most runs never profile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(25)
+    return result, report.getvalue()
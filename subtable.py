@@ -0,0 +1,134 @@
+"""
+Perfect-play table for a single small board
+
+A small board has at most 3^9 = 19683 configurations, so everything about one is worked out once and looked up after
+Each configuration is indexed by its base-3 encoding: index(x_mask, o_mask) = BASE3[x_mask] + 2 * BASE3[o_mask]
+
+The table holds, for every configuration:
+    winner  0 for no one, 1 for X, 2 for O, 3 if the board is full with no winner
+    value   minimax value of the board on its own with X or O to move, 1 for an X win, -1 for an O win
+    best    mask of the squares that keep that value for X or O to move
+    open    mask of the empty squares
+    threats lines X can finish next move minus lines O can finish next move
+
+The table is built the first time it is needed and saved to subtable.bin, later runs load it from there
+`python subtable.py` builds and saves it ahead of time
+"""
+
+import os
+import sys
+from array import array
+
+from bitboard import X, O, FULL, LINES, WINS, SQUARES
+
+SIZE = 3 ** 9
+
+NONE = 0
+X_WON = 1
+O_WON = 2
+DRAWN = 3
+
+# BASE3[mask] is the base-3 number with a 1 digit for every square in the mask
+BASE3 = tuple(sum(3 ** square for square in SQUARES[mask]) for mask in range(512))
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "subtable.bin")
+
+
+def index(x_mask, o_mask):
+    """Index of a small board in the table"""
+    return BASE3[x_mask] + 2 * BASE3[o_mask]
+
+
+class SubTable:
+    """Arrays of everything about every small board, see the module docstring"""
+    def __init__(self):
+        self.winner = array("b", bytes(SIZE))
+        self.value = (array("b", bytes(SIZE)), array("b", bytes(SIZE)))
+        self.best = (array("H", bytes(2 * SIZE)), array("H", bytes(2 * SIZE)))
+        self.open = array("H", bytes(2 * SIZE))
+        self.threats = array("b", bytes(SIZE))
+
+    def arrays(self):
+        """Every array in the order they are saved"""
+        return (self.winner, self.value[X], self.value[O], self.best[X], self.best[O], self.open, self.threats)
+
+    def build(self):
+        """Works out every configuration, fullest boards first so each move's result is known before it is needed"""
+        states = [(x_mask, o_mask) for x_mask in range(512) for o_mask in range(512) if not x_mask & o_mask]
+        states.sort(key=lambda masks: len(SQUARES[masks[0] | masks[1]]), reverse=True)
+
+        for x_mask, o_mask in states:
+            idx = index(x_mask, o_mask)
+            empty = FULL & ~(x_mask | o_mask)
+            self.open[idx] = empty
+            self.threats[idx] = self.count_threats(x_mask, o_mask) - self.count_threats(o_mask, x_mask)
+
+            if WINS[x_mask]:
+                self.winner[idx] = X_WON
+                self.value[X][idx] = self.value[O][idx] = 1
+                continue
+            elif WINS[o_mask]:
+                self.winner[idx] = O_WON
+                self.value[X][idx] = self.value[O][idx] = -1
+                continue
+            elif not empty:
+                self.winner[idx] = DRAWN
+                continue
+
+            # X moves to the highest value, O to the lowest
+            x_values = [(self.value[O][index(x_mask | 1 << square, o_mask)], square) for square in SQUARES[empty]]
+            o_values = [(self.value[X][index(x_mask, o_mask | 1 << square)], square) for square in SQUARES[empty]]
+            x_best = max(x_values)[0]
+            o_best = min(o_values)[0]
+
+            self.value[X][idx] = x_best
+            self.value[O][idx] = o_best
+            self.best[X][idx] = sum(1 << square for value, square in x_values if value == x_best)
+            self.best[O][idx] = sum(1 << square for value, square in o_values if value == o_best)
+
+        return self
+
+    @staticmethod
+    def count_threats(own, opp):
+        """Lines own can finish next move"""
+        return sum(1 for line in LINES if len(SQUARES[own & line]) == 2 and not opp & line)
+
+    def save(self, path=PATH):
+        temporary = "{}.{}.tmp".format(path, os.getpid())  # worker processes may all save it at once
+        with open(temporary, "wb") as file:
+            for table in self.arrays():
+                table.tofile(file)
+        os.replace(temporary, path)
+
+    def load(self, path=PATH):
+        # 10 bytes for each configuration, 196,830 in all, small enough to read whole instead of mapping
+        with open(path, "rb") as file:
+            for table in self.arrays():
+                table.fromfile(file, SIZE)
+                del table[:SIZE]  # fromfile appends to the empty table made by __init__
+        return self
+
+
+_table = None
+
+
+def get_table():
+    """Returns the table, loading or building it the first time"""
+    global _table
+    if _table is None:
+        if os.path.exists(PATH):
+            try:
+                _table = SubTable().load(PATH)
+            except (OSError, EOFError):
+                _table = None
+        if _table is None:
+            _table = SubTable().build()
+            try:
+                _table.save(PATH)
+            except OSError:
+                pass  # a read-only install builds it again next time
+    return _table
+
+
+if __name__ == '__main__':
+    SubTable().build().save(sys.argv[1] if len(sys.argv) > 1 else PATH)
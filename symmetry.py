@@ -0,0 +1,156 @@
+"""
+The 8 symmetries of the board, rotations and reflections of the square
+
+A symmetry moves the small boards around the big board and the squares inside every small board the same way,
+so a position and its 7 images play out identically with the moves mapped across
+Tables keyed by position can store one canonical image instead of all 8, and the root of a search on a symmetric
+position only needs one move out of each set of moves that are images of each other
+
+Transforms are numbered 0-7, 0 is the identity
+"""
+
+from bitboard import GameState, X, O, SQUARES, ZOBRIST_CELLS, ZOBRIST_TARGET, ZOBRIST_SIDE
+
+
+def _rotate(square):
+    row, col = divmod(square, 3)
+    return col * 3 + (2 - row)
+
+
+def _reflect(square):
+    row, col = divmod(square, 3)
+    return row * 3 + (2 - col)
+
+
+def _build():
+    transforms = []
+    for reflected in (False, True):
+        for turns in range(4):
+            mapping = []
+            for square in range(9):
+                image = _reflect(square) if reflected else square
+                for turn in range(turns):
+                    image = _rotate(image)
+                mapping.append(image)
+            transforms.append(tuple(mapping))
+    return tuple(transforms)
+
+
+# SQUARE_MAPS[t][square] is where transform t sends a square, the same map is used for boards
+SQUARE_MAPS = _build()
+INVERSES = tuple(next(u for u in range(8) if all(SQUARE_MAPS[u][SQUARE_MAPS[t][sq]] == sq for sq in range(9)))
+                 for t in range(8))
+
+# CELL_MAPS[t][cell] is where transform t sends a cell (0-80)
+CELL_MAPS = tuple(tuple(mapping[cell // 9] * 9 + mapping[cell % 9] for cell in range(81)) for mapping in SQUARE_MAPS)
+
+# MASK_MAPS[t][mask] is the 9-bit mask with every square sent through transform t
+MASK_MAPS = tuple(tuple(sum(1 << mapping[sq] for sq in SQUARES[mask]) for mask in range(512))
+                  for mapping in SQUARE_MAPS)
+
+
+def map_move(move, transform):
+    """The image of a move under a transform"""
+    return CELL_MAPS[transform][move]
+
+
+def unmap_move(move, transform):
+    """The move that a transform sends to move, turns a move in the canonical position back into the real one"""
+    return CELL_MAPS[INVERSES[transform]][move]
+
+
+def transform_state(state, transform):
+    """A new GameState that is the image of state, made by replaying the images of its moves so undo still works"""
+    cells = CELL_MAPS[transform]
+    other = GameState()
+    for cell in state.played():
+        other.play(cells[cell])
+    return other
+
+
+_board_keys = None
+
+
+def board_keys():
+    """
+    board_keys()[t][side][board][mask] is the Zobrist key of a side's squares on one small board after transform t,
+    built the first time it is needed so the 8 hashes take a lookup per board instead of one per square
+    """
+    global _board_keys
+    if _board_keys is None:
+        _board_keys = tuple(tuple(tuple(_mask_keys([ZOBRIST_CELLS[side][cells[board * 9 + sq]] for sq in range(9)])
+                                        for board in range(9))
+                                  for side in (X, O))
+                            for cells in CELL_MAPS)
+    return _board_keys
+
+
+def _mask_keys(square_keys):
+    """The xor of the keys of the squares in each mask, each mask is a smaller mask plus its lowest square"""
+    keys = [0] * 512
+    for mask in range(1, 512):
+        low = mask & -mask
+        keys[mask] = keys[mask ^ low] ^ square_keys[low.bit_length() - 1]
+    return tuple(keys)
+
+
+def hashes_of(state):
+    """The Zobrist hash of each of the 8 images of the position, hashes_of(state)[0] == state.hash"""
+    keys = board_keys()
+    x_boards, o_boards = state.boards
+    base = ZOBRIST_SIDE if state.side == O else 0
+    hashes = []
+    for transform in range(8):
+        x_keys, o_keys = keys[transform]
+        if state.curr_board is None:
+            value = base ^ ZOBRIST_TARGET[9]
+        else:
+            value = base ^ ZOBRIST_TARGET[SQUARE_MAPS[transform][state.curr_board]]
+        for board in range(9):
+            value ^= x_keys[board][x_boards[board]] ^ o_keys[board][o_boards[board]]
+        hashes.append(value)
+    return hashes
+
+
+def canonical_hash(state):
+    """The smallest hash of the 8 images and the transform that gives it, the key to store the position under"""
+    hashes = hashes_of(state)
+    best = min(range(8), key=hashes.__getitem__)
+    return hashes[best], best
+
+
+def canonical(state):
+    """The canonical image of the position as a new GameState and the transform that gives it"""
+    key, transform = canonical_hash(state)
+    return transform_state(state, transform), transform
+
+
+def canonical_board(x_mask, o_mask):
+    """The canonical image of a single small board as (x_mask, o_mask, transform), the smallest pair of masks"""
+    return min((MASK_MAPS[t][x_mask], MASK_MAPS[t][o_mask], t) for t in range(8))
+
+
+def stabilizer(state):
+    """The transforms that leave the position exactly as it is, always includes the identity"""
+    found = [0]
+    for transform in range(1, 8):
+        mapping = SQUARE_MAPS[transform]
+        masks = MASK_MAPS[transform]
+        if state.curr_board is not None and mapping[state.curr_board] != state.curr_board:
+            continue
+        if all(masks[state.boards[side][board]] == state.boards[side][mapping[board]]
+               for side in (X, O) for board in range(9)):
+            found.append(transform)
+    return found
+
+
+def unique_moves(state, moves=None):
+    """
+    The legal moves with only one move kept from each set that are images of each other under a symmetry of the
+    position. Every move left out leads to a position identical to one reached by a move kept
+    """
+    moves = state.legal_moves() if moves is None else moves
+    symmetries = stabilizer(state)
+    if len(symmetries) == 1:
+        return moves
+    return [move for move in moves if all(CELL_MAPS[t][move] >= move for t in symmetries)]
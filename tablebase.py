@@ -0,0 +1,311 @@
+"""
+Endgame tablebase, exact results for late positions with few empty cells left to play
+
+    python tablebase.py --empty 10 --chunks 64 --positions 200    generates tablebase.bin on every core
+
+Every position stored is solved to the end of the game: a win, draw or loss for the side to move
+and the number of moves until the game ends with best play (the fastest win, or the slowest loss)
+
+Every late position reachable in real games cannot be listed, since the won and drawn boards can be arranged in
+too many ways, so the table is grown from sampled games instead. Random games (or games from a record file) are
+played until at most --empty cells are left on the open boards, and each of those positions is solved with
+every position below it, all of which go in the table
+
+Generation is split into numbered chunks that each save a part file next to the table as they finish
+Running it again skips the chunks already saved, so an interrupted run picks up where it stopped,
+and more chunks can be added later. The parts are then merged into the table file
+
+Positions are stored under their canonical hash (see symmetry.py), so one entry answers for all 8 images of it
+
+The table file is a header, the sorted position hashes and their values, and is read through a memory map
+Probes binary search the hashes in place without copying them, so every process using the file shares one copy
+"""
+
+import argparse
+import bisect
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+from bitboard import GameState, DRAW, SQUARES, bit_count
+from symmetry import canonical_hash
+
+MAGIC = b"STB2"  # STTB files were keyed by the plain hash
+HEADER = struct.Struct("<4sIQ")  # magic, most empty cells, number of positions
+
+LOSS = 0
+DRAWN = 1
+WIN = 2
+
+MAX_EMPTY = 10
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+
+
+def empty_cells(state):
+    """Number of empty cells on the boards that are still open"""
+    return sum(bit_count(state.open_squares(board)) for board in SQUARES[0x1FF & ~state.closed()])
+
+
+def pack(result, distance):
+    return result << 8 | distance
+
+
+def unpack(value):
+    """(result, distance) of a stored value, result is WIN, DRAWN or LOSS for the side to move"""
+    return value >> 8, value & 0xFF
+
+
+def rank(value):
+    """Orders values from the side to move's view, wins first and sooner, then draws, then losses and later"""
+    result, distance = unpack(value)
+    if result == WIN:
+        return 512 - distance
+    if result == LOSS:
+        return distance - 512
+    return 0
+
+
+def solve(state, table, seen=None):
+    """
+    Solves the position exactly, storing it and everything below it in table (canonical hash -> packed value)
+    seen (plain hash -> packed value) saves working out the canonical hash again for positions already solved
+    """
+    seen = {} if seen is None else seen
+    value = seen.get(state.hash)
+    if value is not None:
+        return value
+    key = canonical_hash(state)[0]
+    value = table.get(key)
+    if value is not None:
+        seen[state.hash] = value
+        return value
+
+    mover = state.side
+    best = None
+    for move in state.legal_moves():
+        state.play(move)
+        if state.result == mover:
+            value = pack(WIN, 1)
+        elif state.result == DRAW:
+            value = pack(DRAWN, 1)
+        else:
+            result, distance = unpack(solve(state, table, seen))
+            value = pack(2 - result, distance + 1)
+        state.undo()
+        if best is None or rank(value) > rank(best):
+            best = value
+            if rank(best) == 511:
+                break  # a win in one cannot be beaten
+
+    table[key] = seen[state.hash] = best
+    return best
+
+
+def random_positions(rng, max_empty, count):
+    """Plays random games until count of them reach a position with at most max_empty cells left"""
+    positions = []
+    while len(positions) < count:
+        state = GameState()
+        while not state.is_over() and empty_cells(state) > max_empty:
+            board = rng.choice(state.legal_boards())
+            state.play(board * 9 + rng.choice(SQUARES[state.open_squares(board)]))
+        if not state.is_over():
+            positions.append(state)
+    return positions
+
+
+def record_positions(path, max_empty, chunk, chunks):
+    """The late positions of the games in a record file, every chunks-th game starting from chunk"""
+    from records import RecordReader
+
+    positions = []
+    with RecordReader(path) as reader:
+        for number, record in enumerate(reader):
+            if number % chunks != chunk:
+                continue
+            state = GameState()
+            for move in record.moves:
+                if state.is_over() or empty_cells(state) <= max_empty:
+                    break
+                state.play(move)
+            if not state.is_over() and empty_cells(state) <= max_empty:
+                positions.append(state)
+    return positions
+
+
+def write_table(path, table, max_empty):
+    """Writes a dict of hash -> packed value as a table file, through a temporary file so it is never half written"""
+    keys = array("Q", sorted(table))
+    values = array("H", (table[key] for key in keys))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, max_empty, len(keys)))
+        keys.tofile(file)
+        values.tofile(file)
+    os.replace(temporary, path)
+
+
+def part_path(path, chunk):
+    return path + ".part{:05d}".format(chunk)
+
+
+def generate_chunk(job):
+    """Solves the positions of one chunk and saves them as a part file. Runs in a worker process"""
+    path, chunk, chunks, max_empty, count, seed, records = job
+    sys.setrecursionlimit(max(1000, 4 * max_empty))
+    if records is None:
+        positions = random_positions(random.Random(seed * 1000003 + chunk), max_empty, count)
+    else:
+        positions = record_positions(records, max_empty, chunk, chunks)
+
+    table = {}
+    seen = {}
+    for state in positions:
+        solve(state, table, seen)
+    write_table(part_path(path, chunk), table, max_empty)
+    return chunk, len(positions), len(table)
+
+
+def merge(path, chunks, max_empty):
+    """Merges the part files into the table file"""
+    table = {}
+    for chunk in range(chunks):
+        with Tablebase(part_path(path, chunk)) as part:
+            table.update(zip(part.keys, part.values))
+    write_table(path, table, max_empty)
+    return len(table)
+
+
+def generate(path=PATH, max_empty=MAX_EMPTY, chunks=64, count=100, seed=0, workers=None, records=None):
+    """Generates the chunks that are not saved yet across a process pool, then merges every chunk into path"""
+    jobs = [(path, chunk, chunks, max_empty, count, seed, records)
+            for chunk in range(chunks) if not os.path.exists(part_path(path, chunk))]
+    start = time.perf_counter()
+    if jobs:
+        with multiprocessing.Pool(workers or multiprocessing.cpu_count()) as pool:
+            for chunk, positions, solved in pool.imap_unordered(generate_chunk, jobs):
+                print("chunk {}: {} positions, {} solved".format(chunk, positions, solved), file=sys.stderr)
+    size = merge(path, chunks, max_empty)
+    return {"path": path, "empty": max_empty, "chunks": chunks, "chunks_generated": len(jobs),
+            "positions": size, "seconds": time.perf_counter() - start}
+
+
+class Tablebase:
+    """A table file opened through a memory map, keys and values are views straight onto the mapped file"""
+    def __init__(self, path=PATH):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise ValueError(path + " is too short to be a tablebase file")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.max_empty, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(path + " is not a tablebase file")
+        if len(self.map) != HEADER.size + 10 * count:  # an 8 byte key and a 2 byte value for each position
+            self.close()
+            raise ValueError(path + " is not the size its header gives, it may have been cut short")
+
+        view = memoryview(self.map)
+        keys_end = HEADER.size + 8 * count
+        self.keys = view[HEADER.size:keys_end].cast("Q")
+        self.values = view[keys_end:keys_end + 2 * count].cast("H")
+        view.release()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def probe_hash(self, key):
+        """Packed value stored for a canonical hash, None if it is not in the table"""
+        keys = self.keys
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return self.values[i]
+        return None
+
+    def probe(self, state):
+        """(result, distance) for the side to move, None if the position is not in the table"""
+        if state.result is not None or empty_cells(state) > self.max_empty:
+            return None
+        value = self.probe_hash(canonical_hash(state)[0])
+        return None if value is None else unpack(value)
+
+    def best_move(self, state):
+        """
+        The move that keeps the best result and its (result, distance) for the side to move
+        None unless the position and every reply to it are known
+        """
+        mover = state.side
+        best = None
+        best_move = None
+        for move in state.legal_moves():
+            state.play(move)
+            if state.result == mover:
+                value = pack(WIN, 1)
+            elif state.result == DRAW:
+                value = pack(DRAWN, 1)
+            else:
+                found = self.probe(state)
+                value = None if found is None else pack(2 - found[0], found[1] + 1)
+            state.undo()
+            if value is None:
+                return None
+            if best is None or rank(value) > rank(best):
+                best = value
+                best_move = move
+        if best is None:
+            return None
+        return best_move, unpack(best)
+
+    def close(self):
+        if self.map is None:
+            return
+        if hasattr(self, "keys"):
+            self.keys.release()
+            self.values.release()
+        self.map.close()
+        self.file.close()
+        self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path=PATH):
+    """Opens the tablebase at path, None if it has not been generated or cannot be used, which is reported on stderr"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return Tablebase(path)
+    except (OSError, ValueError) as error:
+        # The file only saves work, a broken one should not stop the engine
+        print("tablebase not loaded, playing without it: {}".format(error), file=sys.stderr)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the endgame tablebase")
+    parser.add_argument("--out", default=PATH)
+    parser.add_argument("--empty", type=int, default=MAX_EMPTY, help="most empty cells a stored position has")
+    parser.add_argument("--chunks", type=int, default=64)
+    parser.add_argument("--positions", type=int, default=100, help="sampled positions solved per chunk")
+    parser.add_argument("--records", default=None, help="take the positions from a game record file instead")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate(args.out, args.empty, args.chunks, args.positions, args.seed, args.workers, args.records)
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
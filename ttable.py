@@ -0,0 +1,113 @@
+"""
+Transposition table for the search, keyed by the Zobrist hash kept by GameState
+
+Entries live in two flat arrays of 64-bit ints so the memory used is fixed by the size given
+Each bucket has two slots: the first keeps the deepest search, the second is always replaced
+"""
+
+from array import array
+
+EXACT = 0  # score is the true value
+LOWER = 1  # score is at least this (the search failed high)
+UPPER = 2  # score is at most this (the search failed low)
+
+ENTRY_BYTES = 16  # one 64-bit key and one 64-bit packed entry
+
+NO_MOVE = 127
+
+# Layout of a packed entry
+SCORE_OFFSET = 1 << 19  # scores are stored shifted so they are never negative
+SCORE_MASK = (1 << 20) - 1
+DEPTH_SHIFT = 20
+FLAG_SHIFT = 27
+MOVE_SHIFT = 29
+AGE_SHIFT = 36
+AGE_MASK = (1 << 28) - 1  # the rest of the 64 bits, wide enough that an old age never comes round again
+
+
+class TranspositionTable:
+    """
+    Stores depth, bound type, score and best move for searched positions
+    Kept between moves of a game so later searches reuse earlier work, call new_search before each search
+    """
+    def __init__(self, size_mb=16):
+        buckets = 1
+        while buckets * 2 * 2 * ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+
+        self.mask = buckets - 1
+        self.keys = array("Q", bytes(buckets * 2 * 8))
+        self.data = array("Q", bytes(buckets * 2 * 8))
+        self.age = 0
+
+        self.hits = 0  # probes that found the position
+        self.misses = 0  # probes that did not
+        self.collisions = 0  # probes that found a different position in the bucket
+        self.stores = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def new_search(self):
+        """Marks the entries so far as old, they are replaced before entries from the new search"""
+        self.age = (self.age + 1) & AGE_MASK
+
+    def clear(self):
+        """Empties the table and resets the counters"""
+        zeros = bytes(len(self.keys) * 8)
+        self.keys = array("Q", zeros)
+        self.data = array("Q", zeros)
+        self.age = 0
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def probe(self, key):
+        """Returns (depth, flag, score, move) for a position, or None if it is not stored. move is None if unknown"""
+        slot = (key & self.mask) << 1
+        keys = self.keys
+
+        if keys[slot] == key:
+            data = self.data[slot]
+        elif keys[slot + 1] == key:
+            data = self.data[slot + 1]
+        else:
+            self.misses += 1
+            if keys[slot] or keys[slot + 1]:
+                self.collisions += 1
+            return None
+
+        self.hits += 1
+        move = data >> MOVE_SHIFT & 0x7F
+        return ((data >> DEPTH_SHIFT & 0x7F), (data >> FLAG_SHIFT & 0x3), (data & SCORE_MASK) - SCORE_OFFSET,
+                None if move == NO_MOVE else move)
+
+    def store(self, key, depth, flag, score, move):
+        """Stores a searched position, the first slot is only replaced by deeper or newer searches"""
+        slot = (key & self.mask) << 1
+        data = ((score + SCORE_OFFSET) | depth << DEPTH_SHIFT | flag << FLAG_SHIFT
+                | (NO_MOVE if move is None else move) << MOVE_SHIFT | self.age << AGE_SHIFT)
+
+        old = self.data[slot]
+        if (self.keys[slot] == key or not self.keys[slot] or old >> AGE_SHIFT != self.age
+                or depth >= (old >> DEPTH_SHIFT & 0x7F)):
+            # The entry it replaces always moves down to the second slot, which is replaced by the next store
+            if self.keys[slot] != key and self.keys[slot]:
+                self.keys[slot + 1] = self.keys[slot]
+                self.data[slot + 1] = old
+        else:
+            slot += 1
+
+        self.keys[slot] = key
+        self.data[slot] = data
+        self.stores += 1
+
+    def fill(self, sample=2000):
+        """Fraction of slots in use, estimated from the first slots of the table"""
+        sample = min(sample, len(self.keys))
+        return sum(1 for slot in range(sample) if self.keys[slot]) / sample
+
+    def stats(self):
+        """Counters for sizing the table"""
+        probes = self.hits + self.misses
+        return {"entries": len(self.keys), "megabytes": len(self.keys) * ENTRY_BYTES / (1024 * 1024),
+                "hits": self.hits, "misses": self.misses, "collisions": self.collisions, "stores": self.stores,
+                "hit_rate": self.hits / probes if probes else 0.0, "fill": self.fill()}
@@ -0,0 +1,153 @@
+"""
+Tunes the weights of the evaluation from finished games, Texel's method
+
+Every position of every game is labelled with how the game ended for X, 1 for a win, 0.5 for a draw, 0 for a loss
+The evaluation for X, the features of evaluate.py times their weights, is turned into an expected result by
+sigmoid(K * score / 400), and the weights are fitted to make that as close to the labels as possible
+K is fitted first with the current weights, so it only rescales them to the results and the tuning changes their ratios
+
+    python tune.py games.bin                        from self-play records, writes weights.json
+    python tune.py results.jsonl --steps 2000       or from selfplay.py's JSONL output
+
+The features of every position are worked out across every core, the fit is done on the whole set at once with NumPy
+The engine loads weights.json when it starts, delete it to go back to the default weights
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import evaluate
+from analyze import read_games
+from bitboard import GameState, X, O
+from records import replay
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SKIP = 4  # opening moves left out of every game, they are the same in too many games to say much
+STEPS = 1000
+RATE = 2.0  # Adam step size, in evaluation points
+VALIDATION = 0.1  # fraction of games held back to check the fit on
+LABELS = {X: 1.0, O: 0.0}  # game result for X, anything else is a draw
+
+
+def game_positions(moves):
+    """(features, label) of every position of one game after the first SKIP moves, empty if the game did not finish"""
+    state = replay(moves)
+    if not state.is_over():
+        return [], []
+    label = LABELS.get(state.result, 0.5)
+
+    rows = []
+    state = GameState()
+    for ply, move in enumerate(moves):
+        if ply >= SKIP:
+            rows.append(evaluate.features(state))
+        state.play(move)
+    return rows, [label] * len(rows)
+
+
+def load_positions(path, workers=None, limit=None):
+    """Feature matrix and labels of every position in a record or JSONL file, split by game into (train, validation)"""
+    games = [moves for number, moves, extra in read_games(path)][:limit]
+    random.Random(0).shuffle(games)
+    held = int(len(games) * VALIDATION)
+
+    sets = []
+    with multiprocessing.Pool(workers or multiprocessing.cpu_count()) as pool:
+        for part in (games[held:], games[:held]):
+            features = []
+            labels = []
+            for rows, results in pool.imap(game_positions, part, chunksize=16):
+                features.extend(rows)
+                labels.extend(results)
+            sets.append((np.array(features, dtype=np.float64).reshape(-1, len(evaluate.FEATURES)),
+                         np.array(labels, dtype=np.float64)))
+    return sets
+
+
+def predict(features, weights, k):
+    return 1 / (1 + np.exp(-k * (features @ weights) / 400))
+
+
+def error(features, labels, weights, k):
+    """Mean squared error of the expected results"""
+    if not len(labels):
+        return 0.0
+    return float(np.mean((predict(features, weights, k) - labels) ** 2))
+
+
+def fit_k(features, labels, weights, low=0.01, high=50.0):
+    """The K with the smallest error for the weights, by ternary search"""
+    for _ in range(60):
+        third = (high - low) / 3
+        if error(features, labels, weights, low + third) < error(features, labels, weights, high - third):
+            high -= third
+        else:
+            low += third
+    return (low + high) / 2
+
+
+def fit_weights(features, labels, weights, k, steps=STEPS, rate=RATE, report=None):
+    """Adam on the mean squared error, all positions at once every step"""
+    weights = weights.copy()
+    first = np.zeros_like(weights)
+    second = np.zeros_like(weights)
+    beta1, beta2 = 0.9, 0.999
+    for step in range(1, steps + 1):
+        p = predict(features, weights, k)
+        gradient = features.T @ ((p - labels) * p * (1 - p)) * (2 * k / 400 / len(labels))
+        first = beta1 * first + (1 - beta1) * gradient
+        second = beta2 * second + (1 - beta2) * gradient ** 2
+        weights -= rate * (first / (1 - beta1 ** step)) / (np.sqrt(second / (1 - beta2 ** step)) + 1e-12)
+        if report is not None and step % 100 == 0:
+            report(step, weights)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tunes the evaluation weights from finished games")
+    parser.add_argument("games", help="record file or JSONL file of games, - for JSONL on stdin")
+    parser.add_argument("--out", default=evaluate.PATH, help="weights file to write")
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--rate", type=float, default=RATE, help="step size in evaluation points")
+    parser.add_argument("--limit", type=int, default=None, help="use at most this many games")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("tune.py needs NumPy")
+
+    start = time.perf_counter()
+    (train, train_labels), (held, held_labels) = load_positions(args.games, args.workers, args.limit)
+    print("{} training and {} validation positions in {:.1f}s".format(
+        len(train_labels), len(held_labels), time.perf_counter() - start), file=sys.stderr)
+    if not len(train_labels):
+        sys.exit("no finished games in " + args.games)
+
+    weights = np.array([evaluate.WEIGHTS[name] for name in evaluate.FEATURES], dtype=np.float64)
+    k = fit_k(train, train_labels, weights)
+    before = (error(train, train_labels, weights, k), error(held, held_labels, weights, k))
+    print("K {:.4f}, error {:.6f} (validation {:.6f})".format(k, *before), file=sys.stderr)
+
+    def report(step, current):
+        print("step {}: error {:.6f} (validation {:.6f})".format(
+            step, error(train, train_labels, current, k), error(held, held_labels, current, k)), file=sys.stderr)
+
+    weights = fit_weights(train, train_labels, weights, k, args.steps, args.rate, report)
+    tuned = dict(zip(evaluate.FEATURES, weights))
+    evaluate.save_weights(tuned, args.out)
+    after = (error(train, train_labels, weights, k), error(held, held_labels, weights, k))
+    print(json.dumps({"out": args.out, "k": k, "error_before": before, "error_after": after,
+                      "weights": {name: int(round(value)) for name, value in tuned.items()},
+                      "seconds": time.perf_counter() - start}))
+
+
+if __name__ == '__main__':
+    main()
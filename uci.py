@@ -0,0 +1,256 @@
+"""
+Long-running engine process driven over stdin and stdout, one command per line, in the style of the UCI chess protocol
+
+    python uci.py                      alpha-beta, loads the tablebase and opening book if they have been built
+    python uci.py --algorithm mcts
+
+Commands:
+    uci                                 replies "id name ..." and "uciok"
+    isready                             replies "readyok", at once even while a search runs
+    newgame                             clears the transposition table and search history
+    position [startpos] [moves 40 36]   sets the position from the empty board and the moves played from it
+    go [movetime 100] [nodes 5000] [depth 6] [infinite]
+                                        searches the position, replies "info ..." after every completed depth and
+                                        "bestmove 37" at the end ("bestmove none" if the game is over)
+                                        with no limits it searches for --time milliseconds
+                                        alpha-beta checks the node limit every 1024 nodes, so it can go over by that
+                                        mcts counts nodes as playouts and has no depth, depth alone is an error
+    stop                                ends the running search and any go sent before it, each replies with its
+                                        best move so far
+    stats                               replies "stats" and a JSON object of counters since the process started
+    quit                                stops the searches the same way, runs the commands sent before it and exits
+
+Commands can be sent without waiting for replies, they run in the order they arrive
+Input is read on a thread of its own, so stop, isready and quit are handled at once, even while a search runs and
+other commands are queued behind it. Every other command waits for the search before it to finish
+A line may hold several commands separated by ";", so a batch of requests is one write,
+and a command may start with "@id", to have every line of its reply start with the same "@id"
+Anything wrong with a command is replied as "error ..." and the process carries on
+
+The engine, its transposition table, tablebase and book stay loaded between commands, so a search costs only itself
+See ucidriver.py for round-trip latency and throughput
+"""
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+
+import book
+import tablebase
+from bitboard import GameState
+from engine import Engine, SearchHandle, ALGORITHMS
+
+NAME = "Strategic Tic-Tac-Toe"
+TIME_MS = 1000
+
+
+class Protocol:
+    """Reads commands from a text stream and writes replies to another, one Engine for the whole session"""
+    def __init__(self, output=sys.stdout, time_ms=TIME_MS, tt_mb=16, algorithm="alphabeta",
+                 tablebase_path=tablebase.PATH, book_path=book.PATH):
+        self.output = output
+        self.time_ms = time_ms
+        self.engine = Engine(time_ms, tt_mb, algorithm, tablebase_path=tablebase_path, book_path=book_path)
+        self.lock = threading.Lock()  # replies come from the reading thread, the command thread and the search thread
+        self.searching = None  # SearchHandle of the running search
+        self.received = 0  # commands read so far
+        self.stop_before = 0  # searches of commands numbered below this are stopped
+        self.tag = ""  # "@id " of the command being handled
+        self.search_tag = ""  # "@id " of the go command of the running search
+        self.started = time.perf_counter()
+        self.counts = {"commands": 0, "searches": 0, "errors": 0, "nodes": 0, "search_seconds": 0.0}
+        if algorithm == "alphabeta":
+            self.engine.searcher.add_hook(self.iteration)
+
+    def send(self, line, tag=None):
+        with self.lock:
+            self.output.write((self.tag if tag is None else tag) + line + "\n")
+            self.output.flush()
+
+    def run(self, lines):
+        """Handles every command in lines (an iterable of text lines) until quit or the end of the input"""
+        commands = queue.Queue()
+        threading.Thread(target=self.read, args=(lines, commands), daemon=True).start()
+        for number, tag, words in iter(commands.get, None):
+            self.handle(number, tag, words)
+        self.wait()
+
+    def read(self, lines, commands):
+        """
+        Reads commands in a thread of its own and queues them for run, except stop, quit and isready,
+        which are handled as they arrive even when other commands are queued behind a search
+        """
+        try:
+            for line in lines:
+                for command in line.split(";"):
+                    words = command.split()
+                    tag = ""
+                    if words and words[0].startswith("@"):
+                        tag = words.pop(0) + " "
+                    if not words:
+                        continue
+                    self.counts["commands"] += 1
+                    self.received += 1
+                    name = words[0]
+                    if name in ("stop", "quit"):
+                        self.stop_before = self.received
+                        self.stop()
+                        if name == "quit":
+                            return
+                    elif name == "isready":
+                        self.send("readyok", tag)
+                    else:
+                        commands.put((self.received, tag, words))
+        finally:
+            commands.put(None)
+
+    def handle(self, number, tag, words):
+        """Runs a command from the queue once the search before it has finished, number counts from the first"""
+        self.tag = tag
+        self.wait()
+        name, args = words[0], words[1:]
+        handler = getattr(self, "command_" + name, None)
+        if handler is None:
+            self.error("unknown command: " + name)
+            return
+        try:
+            handler(args)
+        except ValueError as error:
+            self.error(str(error))
+        # A stop that arrived after this go but before the search started still ends it
+        if number < self.stop_before:
+            self.stop()
+
+    def error(self, message):
+        self.counts["errors"] += 1
+        self.send("error " + message)
+
+    def wait(self):
+        if self.searching is not None:
+            self.searching.result()
+            self.searching = None
+
+    def stop(self):
+        """Ends the running search, from either thread, only wait on the command thread sets searching back to None"""
+        searching = self.searching
+        if searching is not None:
+            searching.cancel()
+
+    def command_uci(self, args):
+        self.send("id name " + NAME)
+        self.send("uciok")
+
+    def command_newgame(self, args):
+        searcher = self.engine.searcher
+        if hasattr(searcher, "tt"):
+            searcher.tt.clear()
+            searcher.history = [[0] * 81, [0] * 81]
+        self.engine.pondered.clear()
+
+    def command_position(self, args):
+        if args and args[0] == "startpos":
+            args = args[1:]
+        if args and args[0] == "moves":
+            args = args[1:]
+        elif args:
+            raise ValueError("expected moves, got " + args[0])
+
+        state = GameState()
+        for word in args:
+            try:
+                move = int(word)
+            except ValueError:
+                raise ValueError("not a move: " + word)
+            if move not in state.legal_moves():
+                raise ValueError("illegal move: " + word)
+            state.play(move)
+        self.engine.state = state
+
+    def command_go(self, args):
+        limits = {"movetime": 0, "nodes": 0, "depth": 0}
+        infinite = False
+        words = iter(args)
+        for word in words:
+            if word == "infinite":
+                infinite = True
+            elif word in limits:
+                value = next(words, None)
+                if value is None or not value.isdigit():
+                    raise ValueError(word + " needs a number")
+                limits[word] = int(value)
+            else:
+                raise ValueError("unknown go option: " + word)
+
+        if self.engine.algorithm == "mcts" and limits["depth"] and not (limits["movetime"] or limits["nodes"]):
+            # MCTS has no depth to stop at, it would run until stopped
+            raise ValueError("mcts searches have no depth, use movetime or nodes")
+        time_ms = limits["movetime"]
+        if not infinite and not any(limits.values()):
+            time_ms = self.time_ms
+        self.searching = SearchHandle(self.search, self.engine.state.copy(), time_ms, limits["depth"] or None,
+                                      limits["nodes"], self.tag)
+
+    def search(self, state, time_ms, depth, nodes, tag, stop_event):
+        """Runs in the search thread, replies with the best move"""
+        self.search_tag = tag
+        engine = self.engine
+        result = engine.book_move(state)
+        if result is None and not state.is_over():
+            if engine.algorithm == "mcts":
+                result = engine.searcher.search(state, time_ms, nodes or None, stop_event)
+            else:
+                result = engine.searcher.search(state, time_ms, depth, stop_event, nodes)
+        self.counts["searches"] += 1
+        if result is None or result.move is None:
+            self.send("bestmove none", tag)
+            return result
+        self.counts["nodes"] += result.nodes
+        self.counts["search_seconds"] += result.seconds
+        engine.last_result = result
+        if result.stats is not None and result.stats.algorithm != "alphabeta":
+            self.send(self.info(result.depth, result.score, result.nodes, result.seconds), tag)
+        self.send("bestmove " + str(result.move), tag)
+        return result
+
+    def iteration(self, event, stats):
+        """Search hook, an info line for every completed depth of alpha-beta"""
+        if event == "iteration":
+            self.send(self.info(stats.depth, stats.score, stats.nodes, stats.seconds), self.search_tag)
+
+    @staticmethod
+    def info(depth, score, nodes, seconds):
+        return "info depth {} score {} nodes {} nps {} time {}".format(
+            depth, score, nodes, int(nodes / seconds) if seconds else 0, int(1000 * seconds))
+
+    def command_stats(self, args):
+        stats = dict(self.counts)
+        stats["uptime_seconds"] = time.perf_counter() - self.started
+        stats["nodes_per_second"] = stats["nodes"] / stats["search_seconds"] if stats["search_seconds"] else 0.0
+        if self.engine.last_result is not None and self.engine.last_result.stats is not None:
+            stats["last"] = self.engine.last_result.stats.as_dict()
+        if hasattr(self.engine.searcher, "tt"):
+            stats["tt"] = self.engine.searcher.tt.stats()
+        self.send("stats " + json.dumps(stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the engine over stdin and stdout, one command per line")
+    parser.add_argument("--algorithm", default="alphabeta", choices=ALGORITHMS)
+    parser.add_argument("--time", type=int, default=TIME_MS, help="milliseconds for a go with no limits")
+    parser.add_argument("--tt", type=int, default=16, help="transposition table megabytes")
+    args = parser.parse_args()
+
+    protocol = Protocol(sys.stdout, args.time, args.tt, args.algorithm)
+    try:
+        protocol.run(sys.stdin)
+    except KeyboardInterrupt:
+        protocol.stop()
+    finally:
+        protocol.engine.close()
+
+
+if __name__ == '__main__':
+    main()
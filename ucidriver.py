@@ -0,0 +1,179 @@
+"""
+Round-trip latency and throughput of uci.py, driven from another process over pipes
+
+    python ucidriver.py --requests 500 --nodes 2000
+    python ucidriver.py --requests 500 --movetime 10 --batch 16
+
+Every request sets a position from a seeded random game and searches it, the reply is its bestmove line
+Runs three ways and prints them as JSON:
+    fresh       a new engine process for every request, what calling the AI costs without a persistent process
+    sequential  one engine process, each request sent once the reply to the one before it has arrived
+    pipelined   one engine process, every request written without waiting, --batch requests to a line
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from bitboard import GameState
+from server import percentile
+
+UCI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci.py")
+
+
+def random_positions(count, seed):
+    """Move lists of positions from random games, none of them finished"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = GameState()
+        for ply in range(rng.randrange(0, 40)):
+            state.play(rng.choice(state.legal_moves()))
+            if state.is_over():
+                state.undo()
+                break
+        positions.append(state.played())
+    return positions
+
+
+def request(number, moves, limit):
+    """The commands of one request, both tagged with its number"""
+    return "@{0} position startpos moves {1}; @{0} go {2}".format(number, " ".join(map(str, moves)), limit)
+
+
+class EngineProcess:
+    """uci.py running as a child process, reply lines are read in a thread and matched to requests by their tag"""
+    def __init__(self, args=()):
+        self.process = subprocess.Popen([sys.executable, UCI] + list(args), stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.replies = {}  # tag -> perf_counter time its bestmove arrived
+        self.arrived = threading.Condition()
+        self.errors = []
+        self.reader = threading.Thread(target=self.read, daemon=True)
+        self.reader.start()
+
+    def read(self):
+        for line in self.process.stdout:
+            words = line.split()
+            if not words:
+                continue
+            tag = words.pop(0) if words[0].startswith("@") else None
+            if words and words[0] == "error":
+                self.errors.append(line.strip())
+            elif words and words[0] in ("bestmove", "readyok"):
+                with self.arrived:
+                    self.replies[tag or words[0]] = time.perf_counter()
+                    self.arrived.notify_all()
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def wait_for(self, tag):
+        with self.arrived:
+            while tag not in self.replies:
+                self.arrived.wait()
+            return self.replies.pop(tag)
+
+    def close(self):
+        try:
+            self.send("quit")
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+
+
+def summary(latencies, seconds):
+    return {"requests": len(latencies), "seconds": seconds,
+            "requests_per_second": len(latencies) / seconds if seconds else 0.0,
+            "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_ms": 1000 * percentile(latencies, 0.5), "p99_ms": 1000 * percentile(latencies, 0.99)}
+
+
+def run_fresh(positions, limit, args):
+    """A new process per request, timed from starting it to its bestmove"""
+    latencies = []
+    start = time.perf_counter()
+    for number, moves in enumerate(positions):
+        sent = time.perf_counter()
+        engine = EngineProcess(args)
+        engine.send(request(number, moves, limit))
+        latencies.append(engine.wait_for("@" + str(number)) - sent)
+        engine.close()
+    return summary(latencies, time.perf_counter() - start)
+
+
+def run_sequential(engine, positions, limit):
+    latencies = []
+    start = time.perf_counter()
+    for number, moves in enumerate(positions):
+        sent = time.perf_counter()
+        engine.send(request(number, moves, limit))
+        latencies.append(engine.wait_for("@" + str(number)) - sent)
+    return summary(latencies, time.perf_counter() - start)
+
+
+def run_pipelined(engine, positions, limit, batch, first=0):
+    """Writes every request from a thread while the replies are collected, latency is from write to reply"""
+    sent = {}
+
+    def write():
+        for group in range(0, len(positions), batch):
+            numbers = range(first + group, first + min(group + batch, len(positions)))
+            line = "; ".join(request(number, positions[number - first], limit) for number in numbers)
+            now = time.perf_counter()
+            for number in numbers:
+                sent[number] = now
+            engine.send(line)
+
+    start = time.perf_counter()
+    writer = threading.Thread(target=write)
+    writer.start()
+    latencies = []
+    for number in range(first, first + len(positions)):
+        arrived = engine.wait_for("@" + str(number))
+        latencies.append(arrived - sent[number])
+    writer.join()
+    return summary(latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures round trips to a persistent uci.py engine process")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--nodes", type=int, default=2000, help="node limit of every search")
+    parser.add_argument("--movetime", type=int, default=None, help="milliseconds per search instead of nodes")
+    parser.add_argument("--batch", type=int, default=8, help="requests written on one line when pipelined")
+    parser.add_argument("--fresh", type=int, default=5, help="requests to time with a new process each")
+    parser.add_argument("--algorithm", default="alphabeta")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    limit = "movetime {}".format(args.movetime) if args.movetime else "nodes {}".format(args.nodes)
+    engine_args = ["--algorithm", args.algorithm]
+    # Different positions for each run, so the pipelined run does not find the sequential run's searches in the table
+    positions = random_positions(2 * args.requests, args.seed)
+    sequential, pipelined = positions[:args.requests], positions[args.requests:]
+    results = {"limit": limit, "fresh": run_fresh(sequential[:args.fresh], limit, engine_args)}
+
+    start = time.perf_counter()
+    engine = EngineProcess(engine_args)
+    engine.send("isready")
+    engine.wait_for("readyok")
+    results["startup_ms"] = 1000 * (time.perf_counter() - start)
+    try:
+        results["sequential"] = run_sequential(engine, sequential, limit)
+        results["pipelined"] = run_pipelined(engine, pipelined, limit, args.batch, first=len(sequential))
+    finally:
+        engine.close()
+    results["errors"] = engine.errors[:10]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""
+The search of a worker process, for the process pools of server.py, book.py, analyze.py and parallel.py
+
+Give start_worker to the pool as its initializer, the tasks then search with worker.searcher
+The transposition table stays in the process between tasks, so the tasks of one pool share their work
+"""
+
+searcher = None  # the worker process's Searcher
+stop = None  # multiprocessing.Event shared by the pool, set to stop every worker, or None
+
+
+def start_worker(tt_mb, weights=None, stop_event=None):
+    """Makes the Searcher of this process, with the evaluation weights given or those already loaded"""
+    global searcher, stop
+    from evaluate import set_weights  # only the worker processes import the search
+    from search import Searcher
+    from subtable import get_table
+    if weights is not None:
+        set_weights(weights)
+    searcher = Searcher(tt_mb=tt_mb)
+    stop = stop_event
+    get_table()  # loaded now rather than in the middle of the first search